@@ -9,3 +9,9 @@ class DjangoSecretsField(AppConfig):
 
     def ready(self) -> None:
         register()(check_secret_field_settings)
+
+        from .instrumentation import load_observers
+        from .warmup import warm_up_on_first_request
+
+        load_observers()
+        warm_up_on_first_request()
@@ -0,0 +1,192 @@
+import base64
+import hashlib
+import os
+from cryptography import fernet
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from functools import cached_property
+from .backends import BaseSecretsBackend
+from django.core.exceptions import ImproperlyConfigured
+from secrets_fields.exceptions import DecryptionException
+
+# first byte of a ciphertext, Fernet tokens always start with 0x80
+AES_GCM = 0x01
+CHACHA20_POLY1305 = 0x02
+ALGORITHMS = {"aes-gcm": AES_GCM, "chacha20-poly1305": CHACHA20_POLY1305}
+
+NONCE_SIZE = 12
+KEY_ID_SIZE = 4
+TAG_SIZE = 16
+
+
+def _key_id(key: bytes) -> bytes:
+    return hashlib.sha256(key).digest()[:KEY_ID_SIZE]
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+class AEADBackend(BaseSecretsBackend):
+    """AES-GCM or ChaCha20-Poly1305 backend with a compact ciphertext
+
+    `encryption_key` is a urlsafe base64 encoded 32 byte key, or a list of
+    keys where values are encrypted with the first key and decrypted with any
+    of them. `algorithm` is `aes-gcm` (default) or `chacha20-poly1305`.
+
+    A ciphertext is the unpadded urlsafe base64 of a version byte, the first 4
+    bytes of the SHA-256 of the key, a 12 byte nonce and the encrypted value
+    with its tag, 33 bytes of overhead against Fernet's 57 plus padding.
+    `fernet_key` (a key or list of keys) allows values written by
+    `EncryptedBackend` to be read, `rotate` re-encrypts them with this backend.
+    """
+
+    @cached_property
+    def _version(self) -> int:
+        algorithm = self.config.get("algorithm", "aes-gcm")
+        if algorithm not in ALGORITHMS:
+            raise ImproperlyConfigured(
+                f"DJANGO_SECRETS_FIELDS['algorithm'] must be one of {', '.join(ALGORITHMS)}"
+            )
+        return ALGORITHMS[algorithm]
+
+    @cached_property
+    def _keys(self) -> dict[bytes, bytes]:
+        """Keys by key id, the first key is the primary key"""
+        keys = self.config.get("encryption_key", None)
+        if not keys:
+            raise ImproperlyConfigured(
+                "DJANGO_SECRETS_FIELDS['encryption_key'] must be set"
+            )
+        if not isinstance(keys, (list, tuple)):
+            keys = [keys]
+
+        result = {}
+        for key in keys:
+            raw = base64.urlsafe_b64decode(key)
+            if len(raw) != 32:
+                raise ImproperlyConfigured(
+                    "DJANGO_SECRETS_FIELDS['encryption_key'] must be 32 url-safe base64-encoded bytes"
+                )
+            result[_key_id(raw)] = raw
+        return result
+
+    @cached_property
+    def _ciphers(self) -> dict[tuple[int, bytes], AESGCM | ChaCha20Poly1305]:
+        """A cipher for each algorithm and key id, so existing values of either
+        algorithm can be read"""
+        return {
+            (version, key_id): cipher(key)
+            for key_id, key in self._keys.items()
+            for version, cipher in (
+                (AES_GCM, AESGCM),
+                (CHACHA20_POLY1305, ChaCha20Poly1305),
+            )
+        }
+
+    @cached_property
+    def _header(self) -> bytes:
+        """Version and key id of new values"""
+        return bytes([self._version]) + next(iter(self._keys))
+
+    @cached_property
+    def _fernet(self) -> fernet.MultiFernet | None:
+        keys = self.config.get("fernet_key", None)
+        if not keys:
+            return None
+        if not isinstance(keys, (list, tuple)):
+            keys = [keys]
+        return fernet.MultiFernet([fernet.Fernet(key) for key in keys])
+
+    def encrypt_bytes(self, plaintext: bytes) -> bytes:
+        """Encrypt to the raw token, without the base64 encoding"""
+        header = self._header
+        cipher = self._ciphers[(header[0], header[1:])]
+        nonce = os.urandom(NONCE_SIZE)
+        return header + nonce + cipher.encrypt(nonce, plaintext, None)
+
+    def decrypt_bytes(self, ciphertext: bytes) -> bytes:
+        """Decrypt a raw token, Fernet tokens are accepted when `fernet_key` is set"""
+        if ciphertext[:1] == b"\x80":
+            # a Fernet token
+            if self._fernet is None:
+                raise DecryptionException(
+                    ValueError("Fernet ciphertext but no fernet_key is set")
+                )
+            try:
+                return self._fernet.decrypt(base64.urlsafe_b64encode(ciphertext))
+            except fernet.InvalidToken as e:
+                raise DecryptionException(e)
+
+        header_size = 1 + KEY_ID_SIZE
+        cipher = (
+            self._ciphers.get((ciphertext[0], ciphertext[1:header_size]))
+            if ciphertext
+            else None
+        )
+        if cipher is None:
+            raise DecryptionException(ValueError("Unknown version or key"))
+        if len(ciphertext) < header_size + NONCE_SIZE + TAG_SIZE:
+            raise DecryptionException(ValueError("Ciphertext is truncated"))
+        nonce = ciphertext[header_size : header_size + NONCE_SIZE]
+        try:
+            return cipher.decrypt(nonce, ciphertext[header_size + NONCE_SIZE :], None)
+        except InvalidTag as e:
+            raise DecryptionException(e)
+
+    def encrypt(self, plaintext: str) -> str:
+        """Create secret using the backend"""
+        token = self.encrypt_bytes(plaintext.encode("utf-8"))
+        return base64.urlsafe_b64encode(token).rstrip(b"=").decode("ascii")
+
+    def decrypt(self, ciphertext: str) -> str:
+        """Get secret from backend
+
+        Args:
+            ciphertext (str): ciphertext
+
+        Raises:
+            DecryptionException: if the ciphertext is invalid
+
+        Returns:
+            str: plaintext secret
+        """
+        try:
+            token = _b64decode(ciphertext)
+        except ValueError as e:
+            raise DecryptionException(e)
+        return self.decrypt_bytes(token).decode("utf-8")
+
+    def decrypt_many(self, ciphertexts: list[str]) -> list[str | Exception]:
+        results: list[str | Exception] = []
+        for ciphertext in ciphertexts:
+            try:
+                results.append(self.decrypt(ciphertext))
+            except DecryptionException as e:
+                results.append(e)
+        return results
+
+    def rotate(self, ciphertext: str) -> str:
+        """Re-encrypt the ciphertext with the first key and configured algorithm
+
+        Ciphertexts that are already current are returned unchanged, Fernet
+        ciphertexts are always re-encrypted.
+
+        Raises:
+            DecryptionException: if the ciphertext cannot be decrypted
+        """
+        plaintext = self.decrypt(ciphertext)
+        try:
+            if _b64decode(ciphertext).startswith(self._header):
+                return ciphertext
+        except ValueError:
+            pass
+        return self.encrypt(plaintext)
+
+    def rotate_bytes(self, ciphertext: bytes) -> bytes:
+        """Re-encrypt the raw token with the first key and configured algorithm,
+        see `rotate`"""
+        plaintext = self.decrypt_bytes(ciphertext)
+        if ciphertext.startswith(self._header):
+            return ciphertext
+        return self.encrypt_bytes(plaintext)
@@ -0,0 +1,125 @@
+"""
+Shared boto3 clients for the AWS backends
+
+Clients are thread safe so one client is built per service and role and shared
+by every backend in the process. Assumed role credentials are cached until
+shortly before they expire and refreshed from a background timer.
+"""
+
+try:
+    import boto3
+except ImportError:
+    raise ImportError(
+        "boto3 is required for AWS Secrets Manager backend - pip install django-secrets-fields[aws]"
+    )
+import botocore.session
+import logging
+import os
+import threading
+import uuid
+from botocore.credentials import RefreshableCredentials
+from datetime import datetime, timezone
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# botocore starts refreshing credentials 15 minutes before they expire, the
+# background refresh fires just inside that window so requests never wait on STS
+REFRESH_BEFORE_EXPIRY = 14 * 60
+
+_clients: dict[tuple[str, str | None], Any] = {}
+_sessions: dict[str, "_AssumedRoleSession"] = {}
+_lock = threading.Lock()
+
+
+class _AssumedRoleSession:
+    """boto3 session using credentials from `sts.assume_role`"""
+
+    def __init__(self, role_arn: str):
+        self.role_arn = role_arn
+        self._timer: threading.Timer | None = None
+        self.credentials = RefreshableCredentials.create_from_metadata(
+            metadata=self._refresh(),
+            refresh_using=self._refresh,
+            method="sts-assume-role",
+        )
+        botocore_session = botocore.session.get_session()
+        botocore_session._credentials = self.credentials
+        self.session = boto3.Session(botocore_session=botocore_session)
+
+    def _refresh(self) -> dict[str, str]:
+        credentials = boto3.client("sts").assume_role(
+            RoleArn=self.role_arn, RoleSessionName=str(uuid.uuid4())
+        )["Credentials"]
+        self._schedule_refresh(credentials["Expiration"])
+        return {
+            "access_key": credentials["AccessKeyId"],
+            "secret_key": credentials["SecretAccessKey"],
+            "token": credentials["SessionToken"],
+            "expiry_time": credentials["Expiration"].isoformat(),
+        }
+
+    def _schedule_refresh(self, expiration: datetime) -> None:
+        self.cancel()
+        delay = (expiration - datetime.now(timezone.utc)).total_seconds()
+        self._timer = threading.Timer(
+            max(delay - REFRESH_BEFORE_EXPIRY, 0.0), self._background_refresh
+        )
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self) -> None:
+        try:
+            # refreshes the credentials as we are inside the advisory window
+            self.credentials.get_frozen_credentials()
+        except Exception:
+            logger.warning(
+                "Refreshing credentials for %s failed", self.role_arn, exc_info=True
+            )
+
+    def cancel(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+def get_client(service_name: str, role_arn: str | None = None) -> Any:
+    """
+    Get a boto3 client for `service_name`, optionally assuming `role_arn`
+    """
+    key = (service_name, role_arn)
+    try:
+        return _clients[key]
+    except KeyError:
+        pass
+
+    with _lock:
+        if key not in _clients:
+            if role_arn:
+                if role_arn not in _sessions:
+                    _sessions[role_arn] = _AssumedRoleSession(role_arn)
+                _clients[key] = _sessions[role_arn].session.client(service_name)
+            else:
+                _clients[key] = boto3.client(service_name)
+        return _clients[key]
+
+
+def clear_clients() -> None:
+    """Drop all cached clients and assumed role credentials"""
+    with _lock:
+        for session in _sessions.values():
+            session.cancel()
+        _sessions.clear()
+        _clients.clear()
+
+
+def _reset_after_fork() -> None:
+    # the lock may have been held by another thread at fork time and the refresh
+    # timers do not exist in the child, start again from a clean state
+    global _lock
+    _lock = threading.Lock()
+    _sessions.clear()
+    _clients.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,6 +1,13 @@
+import hashlib
+import hmac
+from django.core.exceptions import ImproperlyConfigured
+
+
 class BaseSecretsBackend:
     def __init__(self, config: dict):
         self.config = config
+        # set by `get_backend`
+        self.alias: str | None = None
 
     def encrypt(self, plaintext: str) -> str:
         """Encrypt the secret value using the backend"""
@@ -19,3 +26,126 @@ class BaseSecretsBackend:
             str: plaintext
         """
         raise NotImplementedError()
+
+    def encrypt_bytes(self, plaintext: bytes) -> bytes:
+        """Encrypt a binary value, the ciphertext is stored as is in a binary column
+
+        Raises:
+            NotImplementedError: if the backend cannot encrypt binary values
+        """
+        raise NotImplementedError()
+
+    def decrypt_bytes(self, ciphertext: bytes) -> bytes:
+        """Decrypt a value encrypted with `encrypt_bytes`
+
+        Raises:
+            DecryptionException: if the ciphertext is invalid
+            NotImplementedError: if the backend cannot encrypt binary values
+        """
+        raise NotImplementedError()
+
+    def encrypt_many(self, plaintexts: list[str]) -> list[str | Exception]:
+        """Encrypt many values, by default one at a time
+
+        Args:
+            plaintexts (list[str]): values to encrypt
+
+        Returns:
+            list[str | Exception]: the ciphertext for each value in order, or the
+                exception raised encrypting it
+        """
+        results: list[str | Exception] = []
+        for plaintext in plaintexts:
+            try:
+                results.append(self.encrypt(plaintext))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def decrypt_many(self, ciphertexts: list[str]) -> list[str | Exception]:
+        """Decrypt many values, by default one at a time
+
+        Args:
+            ciphertexts (list[str]): values to decrypt
+
+        Returns:
+            list[str | Exception]: the plaintext for each value in order, or the
+                exception raised decrypting it
+        """
+        results: list[str | Exception] = []
+        for ciphertext in ciphertexts:
+            try:
+                results.append(self.decrypt(ciphertext))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def rotate(self, ciphertext: str) -> str:
+        """Re-encrypt the ciphertext with the current key
+
+        Backends should return the ciphertext unchanged if it is already
+        encrypted with the current key, by default it is always re-encrypted.
+
+        Raises:
+            DecryptionException: if the ciphertext is invalid
+        """
+        return self.encrypt(self.decrypt(ciphertext))
+
+    def rotate_bytes(self, ciphertext: bytes) -> bytes:
+        """Re-encrypt a value encrypted with `encrypt_bytes` with the current key,
+        see `rotate`
+
+        Raises:
+            DecryptionException: if the ciphertext is invalid
+            NotImplementedError: if the backend cannot encrypt binary values
+        """
+        return self.encrypt_bytes(self.decrypt_bytes(ciphertext))
+
+    def invalidate(self, ciphertext: str | None = None) -> None:
+        """Drop any plaintext the backend has cached
+
+        Args:
+            ciphertext (str | None): only drop this value, drop everything if None
+        """
+
+    def prefetch(self, ciphertexts: list[str]) -> dict[str, str]:
+        """Resolve many ciphertexts at once
+
+        Backends that can fetch values in bulk override this, values that are
+        not returned are decrypted one at a time when accessed.
+
+        Args:
+            ciphertexts (list[str]): ciphertexts to resolve
+
+        Returns:
+            dict[str, str]: plaintext for each ciphertext that was resolved
+        """
+        return {}
+
+    def warm(self) -> int:
+        """Load the values the backend stores into its cache ahead of time
+
+        Backends without a cache have nothing to load.
+
+        Returns:
+            int: number of values loaded
+        """
+        return 0
+
+    def blind_index(self, plaintext: str) -> str:
+        """Keyed hash of the plaintext, used to look up rows by secret value
+
+        The same plaintext always gives the same index, unlike the ciphertext,
+        without the `blind_index_key` the index reveals nothing about the value.
+
+        Returns:
+            str: hex encoded HMAC-SHA256 of the plaintext
+        """
+        key = self.config.get("blind_index_key", None)
+        if not key:
+            raise ImproperlyConfigured(
+                "DJANGO_SECRETS_FIELDS['blind_index_key'] must be set"
+            )
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        return hmac.new(key, plaintext.encode("utf-8"), hashlib.sha256).hexdigest()
@@ -1,4 +1,6 @@
+import base64
 from cryptography import fernet
+from functools import cached_property
 from .backends import BaseSecretsBackend
 from django.core.exceptions import ImproperlyConfigured
 from secrets_fields.exceptions import DecryptionException
@@ -7,19 +9,30 @@ from secrets_fields.exceptions import DecryptionException
 class EncryptedBackend(BaseSecretsBackend):
     """Encrypted field backend
 
-    Uses an encryption key to encrypt and decrypt values
+    Uses an encryption key to encrypt and decrypt values. `encryption_key` can
+    also be a list of keys, values are encrypted with the first key and
+    decrypted with any of them.
     """
 
-    @property
-    def _crypter(self) -> fernet.Fernet:
+    @cached_property
+    def _crypter(self) -> fernet.Fernet | fernet.MultiFernet:
         key = self.config.get("encryption_key", None)
         if not key:
             raise ImproperlyConfigured(
                 "DJANGO_SECRETS_FIELDS['encryption_key'] must be set"
             )
 
+        if isinstance(key, (list, tuple)):
+            return fernet.MultiFernet([fernet.Fernet(k) for k in key])
         return fernet.Fernet(key)
 
+    @cached_property
+    def _primary(self) -> fernet.Fernet:
+        """The key new values are encrypted with"""
+        if isinstance(self._crypter, fernet.MultiFernet):
+            return fernet.Fernet(self.config["encryption_key"][0])
+        return self._crypter
+
     def encrypt(self, plaintext: str) -> str:
         """Create secret using the backend"""
         encrypted: bytes = self._crypter.encrypt(plaintext.encode("utf-8"))
@@ -43,3 +56,67 @@ class EncryptedBackend(BaseSecretsBackend):
             raise DecryptionException(e)
         else:
             return decrypted.decode("utf-8")
+
+    def encrypt_bytes(self, plaintext: bytes) -> bytes:
+        """Encrypt to the raw Fernet token, without the base64 encoding"""
+        return base64.urlsafe_b64decode(self._crypter.encrypt(plaintext))
+
+    def decrypt_bytes(self, ciphertext: bytes) -> bytes:
+        try:
+            return self._crypter.decrypt(base64.urlsafe_b64encode(ciphertext))
+        except fernet.InvalidToken as e:
+            raise DecryptionException(e)
+
+    def encrypt_many(self, plaintexts: list[str]) -> list[str | Exception]:
+        crypter = self._crypter
+        results: list[str | Exception] = []
+        for plaintext in plaintexts:
+            try:
+                results.append(
+                    crypter.encrypt(plaintext.encode("utf-8")).decode("utf-8")
+                )
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def decrypt_many(self, ciphertexts: list[str]) -> list[str | Exception]:
+        crypter = self._crypter
+        results: list[str | Exception] = []
+        for ciphertext in ciphertexts:
+            try:
+                results.append(
+                    crypter.decrypt(ciphertext.encode("utf-8")).decode("utf-8")
+                )
+            except fernet.InvalidToken as e:
+                results.append(DecryptionException(e))
+        return results
+
+    def rotate(self, ciphertext: str) -> str:
+        """Re-encrypt the ciphertext with the first key
+
+        Ciphertexts already encrypted with the first key are returned unchanged.
+
+        Raises:
+            DecryptionException: if none of the keys can decrypt the ciphertext
+        """
+        token = ciphertext.encode("utf-8")
+        try:
+            self._primary.decrypt(token)
+        except fernet.InvalidToken:
+            pass
+        else:
+            return ciphertext
+
+        if not isinstance(self._crypter, fernet.MultiFernet):
+            raise DecryptionException(fernet.InvalidToken())
+        try:
+            rotated: bytes = self._crypter.rotate(token)
+        except fernet.InvalidToken as e:
+            raise DecryptionException(e)
+        else:
+            return rotated.decode("utf-8")
+
+    def rotate_bytes(self, ciphertext: bytes) -> bytes:
+        """Re-encrypt the raw token with the first key, see `rotate`"""
+        token = base64.urlsafe_b64encode(ciphertext).decode("ascii")
+        return base64.urlsafe_b64decode(self.rotate(token))
@@ -0,0 +1,237 @@
+"""
+Envelope encryption, each value is encrypted with a data key that is stored
+next to it wrapped by a master key held by a key provider
+"""
+
+import base64
+import hashlib
+import os
+import threading
+import time
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from functools import cached_property
+from .backends import BaseSecretsBackend
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from secrets_fields.cache import DEFAULT_MAXSIZE, TTLCache
+from secrets_fields.exceptions import DecryptionException
+from typing import cast
+
+# first byte of a ciphertext
+VERSION = 0x01
+NONCE_SIZE = 12
+KEY_ID_SIZE = 4
+TAG_SIZE = 16
+
+# seconds a data key is used to encrypt new values before a new one is generated
+DEFAULT_DATA_KEY_MAX_AGE = 300
+# seconds an unwrapped data key is kept for decrypting
+DEFAULT_DATA_KEY_CACHE_TTL = 300
+
+
+class KeyProvider:
+    """Generates data keys and unwraps them with a master key"""
+
+    def __init__(self, config: dict):
+        self.config = config
+
+    def generate_data_key(self) -> tuple[bytes, bytes]:
+        """Create a new 32 byte data key
+
+        Returns:
+            tuple[bytes, bytes]: the data key and the data key wrapped by the master key
+        """
+        raise NotImplementedError()
+
+    def decrypt_data_key(self, wrapped: bytes) -> bytes:
+        """Unwrap a data key returned by `generate_data_key`
+
+        Raises:
+            DecryptionException: if the data key cannot be unwrapped
+        """
+        raise NotImplementedError()
+
+    def needs_rotation(self, wrapped: bytes) -> bool:
+        """The data key is not wrapped by the current master key"""
+        return False
+
+
+class LocalKeyProvider(KeyProvider):
+    """Master keys read from `key_file`
+
+    The file has one url-safe base64-encoded 32 byte key per line, data keys are
+    wrapped with the first key and can be unwrapped with any of them.
+    """
+
+    @cached_property
+    def _keys(self) -> list[tuple[bytes, AESGCM]]:
+        path = self.config.get("key_file", None)
+        if not path:
+            raise ImproperlyConfigured("DJANGO_SECRETS_FIELDS['key_file'] must be set")
+        with open(path) as f:
+            keys = [
+                base64.urlsafe_b64decode(line.strip()) for line in f if line.strip()
+            ]
+        if not keys:
+            raise ImproperlyConfigured(f"{path} does not contain any keys")
+        return [
+            (hashlib.sha256(key).digest()[:KEY_ID_SIZE], AESGCM(key)) for key in keys
+        ]
+
+    def generate_data_key(self) -> tuple[bytes, bytes]:
+        key_id, master = self._keys[0]
+        data_key = AESGCM.generate_key(bit_length=256)
+        nonce = os.urandom(NONCE_SIZE)
+        return data_key, key_id + nonce + master.encrypt(nonce, data_key, key_id)
+
+    def decrypt_data_key(self, wrapped: bytes) -> bytes:
+        if len(wrapped) < KEY_ID_SIZE + NONCE_SIZE + TAG_SIZE:
+            raise DecryptionException(ValueError("Wrapped data key is truncated"))
+        key_id = wrapped[:KEY_ID_SIZE]
+        nonce = wrapped[KEY_ID_SIZE : KEY_ID_SIZE + NONCE_SIZE]
+        for candidate, master in self._keys:
+            if candidate == key_id:
+                try:
+                    return master.decrypt(
+                        nonce, wrapped[KEY_ID_SIZE + NONCE_SIZE :], key_id
+                    )
+                except InvalidTag as e:
+                    raise DecryptionException(e)
+        raise DecryptionException(ValueError("Unknown master key"))
+
+    def needs_rotation(self, wrapped: bytes) -> bool:
+        return wrapped[:KEY_ID_SIZE] != self._keys[0][0]
+
+
+class EnvelopeBackend(BaseSecretsBackend):
+    """Envelope encryption backend
+
+    `key_provider` is the import path of a `KeyProvider`, it gets the same
+    config as the backend. Values are encrypted with AES-GCM under a data key
+    that is reused for `data_key_max_age` seconds (default 300), unwrapped
+    data keys are cached for `data_key_cache_ttl` seconds (default 300) with at
+    most `data_key_cache_maxsize` entries (default 1024) so reading many rows
+    does not call the key provider for each of them.
+    """
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.data_keys: TTLCache[bytes] = TTLCache(
+            ttl=self.config.get("data_key_cache_ttl", DEFAULT_DATA_KEY_CACHE_TTL),
+            maxsize=self.config.get("data_key_cache_maxsize", DEFAULT_MAXSIZE),
+        )
+        self._current: tuple[float, bytes, bytes] | None = None
+        self._lock = threading.Lock()
+
+    @cached_property
+    def key_provider(self) -> KeyProvider:
+        provider = self.config.get("key_provider", None)
+        if not provider:
+            raise ImproperlyConfigured(
+                "DJANGO_SECRETS_FIELDS['key_provider'] must be set"
+            )
+        return cast(KeyProvider, import_string(provider)(self.config))
+
+    def _data_key(self) -> tuple[bytes, bytes]:
+        """The data key for new values and its wrapped form"""
+        max_age = self.config.get("data_key_max_age", DEFAULT_DATA_KEY_MAX_AGE)
+        with self._lock:
+            if self._current is None or self._current[0] <= time.monotonic():
+                data_key, wrapped = self.key_provider.generate_data_key()
+                self._current = (time.monotonic() + max_age, data_key, wrapped)
+                self.data_keys.set(base64.b64encode(wrapped).decode("ascii"), data_key)
+            return self._current[1], self._current[2]
+
+    def _unwrap(self, wrapped: bytes) -> bytes:
+        key = base64.b64encode(wrapped).decode("ascii")
+        data_key = self.data_keys.get(key)
+        if data_key is None:
+            data_key = self.key_provider.decrypt_data_key(wrapped)
+            self.data_keys.set(key, data_key)
+        return data_key
+
+    @staticmethod
+    def _split(ciphertext: bytes) -> tuple[bytes, bytes, bytes]:
+        """Wrapped data key, nonce and encrypted value of a ciphertext"""
+        if len(ciphertext) < 3 or ciphertext[0] != VERSION:
+            raise DecryptionException(ValueError("Unknown ciphertext version"))
+        size = int.from_bytes(ciphertext[1:3], "big")
+        if not size or len(ciphertext) < 3 + size + NONCE_SIZE + TAG_SIZE:
+            raise DecryptionException(ValueError("Ciphertext is truncated"))
+        wrapped = ciphertext[3 : 3 + size]
+        nonce = ciphertext[3 + size : 3 + size + NONCE_SIZE]
+        return wrapped, nonce, ciphertext[3 + size + NONCE_SIZE :]
+
+    def encrypt_bytes(self, plaintext: bytes) -> bytes:
+        data_key, wrapped = self._data_key()
+        nonce = os.urandom(NONCE_SIZE)
+        return (
+            bytes([VERSION])
+            + len(wrapped).to_bytes(2, "big")
+            + wrapped
+            + nonce
+            + AESGCM(data_key).encrypt(nonce, plaintext, None)
+        )
+
+    def decrypt_bytes(self, ciphertext: bytes) -> bytes:
+        wrapped, nonce, encrypted = self._split(ciphertext)
+        try:
+            return AESGCM(self._unwrap(wrapped)).decrypt(nonce, encrypted, None)
+        except InvalidTag as e:
+            raise DecryptionException(e)
+
+    def encrypt(self, plaintext: str) -> str:
+        """Create secret using the backend"""
+        token = self.encrypt_bytes(plaintext.encode("utf-8"))
+        return base64.urlsafe_b64encode(token).decode("ascii")
+
+    def decrypt(self, ciphertext: str) -> str:
+        """Get secret from backend
+
+        Args:
+            ciphertext (str): ciphertext
+
+        Raises:
+            DecryptionException: if the ciphertext is invalid
+
+        Returns:
+            str: plaintext secret
+        """
+        try:
+            token = base64.urlsafe_b64decode(ciphertext)
+        except ValueError as e:
+            raise DecryptionException(e)
+        return self.decrypt_bytes(token).decode("utf-8")
+
+    def rotate(self, ciphertext: str) -> str:
+        """Re-encrypt values whose data key is not wrapped by the current master key
+
+        Raises:
+            DecryptionException: if the ciphertext is invalid
+        """
+        plaintext = self.decrypt(ciphertext)
+        wrapped, _, _ = self._split(base64.urlsafe_b64decode(ciphertext))
+        if not self.key_provider.needs_rotation(wrapped):
+            return ciphertext
+        return self.encrypt(plaintext)
+
+    def rotate_bytes(self, ciphertext: bytes) -> bytes:
+        """Re-encrypt a raw value whose data key is not wrapped by the current
+        master key, see `rotate`"""
+        plaintext = self.decrypt_bytes(ciphertext)
+        wrapped, _, _ = self._split(ciphertext)
+        if not self.key_provider.needs_rotation(wrapped):
+            return ciphertext
+        return self.encrypt_bytes(plaintext)
+
+    def invalidate(self, ciphertext: str | None = None) -> None:
+        """Drop all cached data keys, the next value encrypted gets a new data key
+
+        Values are never cached so invalidating a single ciphertext does nothing.
+        """
+        if ciphertext is not None:
+            return
+        self.data_keys.invalidate()
+        with self._lock:
+            self._current = None
@@ -0,0 +1,36 @@
+"""
+Key provider for `EnvelopeBackend` using AWS KMS
+"""
+
+from .aws import get_client
+from .envelope import KeyProvider
+from secrets_fields.exceptions import DecryptionException
+from django.core.exceptions import ImproperlyConfigured
+from typing import Any, cast
+
+
+class KMSKeyProvider(KeyProvider):
+    """Data keys generated and unwrapped by the KMS key `kms_key_id`
+
+    `role_arn` is assumed for the KMS calls if set.
+    """
+
+    @property
+    def client(self) -> Any:
+        return get_client("kms", role_arn=self.config.get("role_arn", None))
+
+    def generate_data_key(self) -> tuple[bytes, bytes]:
+        key_id = self.config.get("kms_key_id", None)
+        if not key_id:
+            raise ImproperlyConfigured(
+                "DJANGO_SECRETS_FIELDS['kms_key_id'] must be set"
+            )
+        response = self.client.generate_data_key(KeyId=key_id, KeySpec="AES_256")
+        return response["Plaintext"], response["CiphertextBlob"]
+
+    def decrypt_data_key(self, wrapped: bytes) -> bytes:
+        try:
+            response = self.client.decrypt(CiphertextBlob=wrapped)
+        except self.client.exceptions.InvalidCiphertextException as e:
+            raise DecryptionException(e)
+        return cast(bytes, response["Plaintext"])
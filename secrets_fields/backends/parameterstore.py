@@ -0,0 +1,88 @@
+from .aws import get_client
+from .secretsmanager import SecretsManagerBackend
+from secrets_fields.exceptions import DecryptionException
+from typing import Any, cast
+
+# maximum number of parameters in one GetParameters call
+BATCH_SIZE = 10
+
+
+class ParameterStoreBackend(SecretsManagerBackend):
+    """AWS Systems Manager Parameter Store backend
+
+    Values are stored as SecureString parameters under `prefix`, named by the
+    hash of the plaintext like `SecretsManagerBackend`, with the same caching
+    and `cache_ttl`, `cache_maxsize` and `batch_workers` options. `tier` sets
+    the parameter tier (default `Standard`, values up to 4KB).
+
+    `prefetch` and `decrypt_many` use GetParameters with 10 names per call,
+    `load_path` loads every parameter under the prefix into the cache, it is
+    also what `warm` does.
+    """
+
+    batch_size = BATCH_SIZE
+
+    @property
+    def client_ro(self) -> Any:
+        return get_client("ssm", role_arn=self.config.get("role_arn_ro", None))
+
+    @property
+    def client_rw(self) -> Any:
+        return get_client("ssm", role_arn=self.config.get("role_arn_rw", None))
+
+    def _create(self, name: str, plaintext: str) -> None:
+        try:
+            self.client_rw.put_parameter(
+                Name=name,
+                Value=plaintext,
+                Type="SecureString",
+                Tier=self.config.get("tier", "Standard"),
+                Tags=[{"Key": "Managed-By", "Value": "django-secrets-fields"}],
+            )
+        except self.client_rw.exceptions.ParameterAlreadyExists:
+            # the name is a hash of the plaintext so the value is the same
+            pass
+
+    def _get_value(self, name: str) -> str:
+        try:
+            response = self.client_ro.get_parameter(Name=name, WithDecryption=True)
+        except self.client_ro.exceptions.ParameterNotFound as e:
+            raise DecryptionException(e)
+        return cast(str, response["Parameter"]["Value"])
+
+    def load_path(self) -> int:
+        """Load every parameter under `prefix` into the cache
+
+        Uses GetParametersByPath, which returns up to 10 parameters per call.
+
+        Returns:
+            int: number of parameters loaded
+        """
+        prefix = self.config.get("prefix", None)
+        if not prefix:
+            raise ValueError("DJANGO_SECRETS_FIELDS['backend']['prefix'] must be set")
+        paginator = self.client_ro.get_paginator("get_parameters_by_path")
+        count = 0
+        for page in paginator.paginate(
+            Path=prefix.rstrip("/") or "/", Recursive=True, WithDecryption=True
+        ):
+            values = {p["Name"]: p["Value"] for p in page["Parameters"]}
+            self._store(values)
+            for name in values:
+                self.known.set(name, True)
+            count += len(values)
+        return count
+
+    def warm(self) -> int:
+        return self.load_path()
+
+    def _batch_get(self, names: list[str]) -> dict[str, str | Exception]:
+        response = self.client_ro.get_parameters(Names=names, WithDecryption=True)
+
+        results: dict[str, str | Exception] = {}
+        for parameter in response["Parameters"]:
+            results[parameter["Name"]] = parameter["Value"]
+        for name in names:
+            if name not in results:
+                results[name] = DecryptionException(KeyError(name))
+        return results
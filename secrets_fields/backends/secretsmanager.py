@@ -5,31 +5,109 @@ except ImportError:
         "boto3 is required for AWS Secrets Manager backend - pip install django-secrets-fields[aws]"
     )
 import hashlib
-import uuid
+import logging
+import threading
+import time
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from .aws import get_client
 from .backends import BaseSecretsBackend
-from secrets_fields.exceptions import DecryptionException
-from typing import cast
+from secrets_fields import instrumentation
+from secrets_fields.cache import (
+    DEFAULT_MAXSIZE,
+    DEFAULT_SHARED_TTL,
+    DEFAULT_TTL,
+    SharedCache,
+    TTLCache,
+)
+from secrets_fields.circuit import DEFAULT_RESET_TIMEOUT, CircuitBreaker
+from secrets_fields.exceptions import CircuitOpenException, DecryptionException
+from typing import Callable, TypeVar, cast
+
+logger = logging.getLogger(__name__)
+
+# maximum number of secrets in one BatchGetSecretValue call
+BATCH_SIZE = 20
+
+A = TypeVar("A")
+R = TypeVar("R")
 
 
 class SecretsManagerBackend(BaseSecretsBackend):
     """AWS Secrets Manager backend
 
-    Uses AWS Secrets Manager to store secrets
+    Uses AWS Secrets Manager to store secrets, decrypted values are cached in
+    memory for `cache_ttl` seconds (default 30) with at most `cache_maxsize`
+    entries (default 1024). Set `cache_ttl` to 0 to disable the cache.
+
+    `shared_cache` names a Django cache used as a second tier shared between
+    processes, entries are encrypted with the Fernet key `shared_cache_key`
+    and expire after `shared_cache_ttl` seconds (default 300).
+
+    Names of secrets known to exist are kept (up to `cache_maxsize`) so saving
+    the same plaintext again makes no requests.
+
+    `prefetch` and `decrypt_many` resolve secrets in batches of 20, using up to
+    `batch_workers` concurrent requests (default 4), `encrypt_many` creates
+    secrets concurrently.
+
+    To stay responsive when AWS is slow or failing:
+    - values up to `stale_ttl` seconds past their expiry (default 0) are
+      returned straight away and refreshed in batches on a single background
+      thread
+    - secrets that were not found are remembered for `negative_cache_ttl`
+      seconds (default 0)
+    - after `circuit_breaker_threshold` consecutive errors (default 0, disabled)
+      requests fail fast with `CircuitOpenException` for
+      `circuit_breaker_reset` seconds (default 30)
     """
 
+    batch_size = BATCH_SIZE
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.cache: TTLCache[str] = TTLCache(
+            ttl=self.config.get("cache_ttl", DEFAULT_TTL),
+            maxsize=self.config.get("cache_maxsize", DEFAULT_MAXSIZE),
+            stale_ttl=self.config.get("stale_ttl", 0),
+        )
+        self.not_found: TTLCache[bool] = TTLCache(
+            ttl=self.config.get("negative_cache_ttl", 0),
+            maxsize=self.config.get("cache_maxsize", DEFAULT_MAXSIZE),
+        )
+        self.breaker = CircuitBreaker(
+            threshold=self.config.get("circuit_breaker_threshold", 0),
+            reset_timeout=self.config.get(
+                "circuit_breaker_reset", DEFAULT_RESET_TIMEOUT
+            ),
+        )
+        self._refreshing: set[str] = set()
+        self._refreshing_lock = threading.Lock()
+        # threads are only started once something needs refreshing
+        self._refresher = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="secrets-refresh"
+        )
+        self.shared: SharedCache | None = None
+        if self.config.get("shared_cache", None):
+            self.shared = SharedCache(
+                self.config["shared_cache"],
+                key=self.config.get("shared_cache_key", None),
+                ttl=self.config.get("shared_cache_ttl", DEFAULT_SHARED_TTL),
+            )
+        # secrets are never deleted by us, so a name that exists never expires
+        self.known: TTLCache[bool] = TTLCache(
+            ttl=None, maxsize=self.config.get("cache_maxsize", DEFAULT_MAXSIZE)
+        )
+
     @property
     def client_ro(self) -> boto3.client:
         role_arn_ro = self.config.get("role_arn_ro", None)
-        return _get_client(
-            role_arn=role_arn_ro,
-        )
+        return get_client("secretsmanager", role_arn=role_arn_ro)
 
     @property
     def client_rw(self) -> boto3.client:
         role_rw = self.config.get("role_arn_rw", None)
-        return _get_client(
-            role_arn=role_rw,
-        )
+        return get_client("secretsmanager", role_arn=role_rw)
 
     def _generate_name(self, plaintext: str) -> str:
         """
@@ -47,15 +125,24 @@ class SecretsManagerBackend(BaseSecretsBackend):
             str: secret path
         """
         name = self._generate_name(plaintext)
+        if not self.known.get(name):
+            self._create(name, plaintext)
+            self.known.set(name, True)
+        self.not_found.invalidate(name)
+        self._store({name: plaintext})
+        return name
+
+    def _create(self, name: str, plaintext: str) -> None:
+        """Store `plaintext` in AWS under `name`, unless it already exists"""
         try:
-            self.client_ro.get_secret_value(SecretId=name)
-        except self.client_ro.exceptions.ResourceNotFoundException:
             self.client_rw.create_secret(
                 Name=name,
                 SecretString=plaintext,
                 Tags=[{"Key": "Managed-By", "Value": "django-secrets-fields"}],
             )
-        return name
+        except self.client_rw.exceptions.ResourceExistsException:
+            # the name is a hash of the plaintext so the value is the same
+            pass
 
     def decrypt(self, ciphertext: str) -> str:
         """Get secret from backend
@@ -66,30 +153,265 @@ class SecretsManagerBackend(BaseSecretsBackend):
         Returns:
             str: plaintext secret
         """
+        plaintext = self._cached([ciphertext]).get(ciphertext)
+        if plaintext is not None:
+            return plaintext
+        plaintext = self.cache.get_stale(ciphertext)
+        if plaintext is not None:
+            self._refresh_in_background([ciphertext])
+            return plaintext
+        return self._fetch(ciphertext)
+
+    def _get_value(self, name: str) -> str:
+        """Read a single secret from AWS
+
+        Raises:
+            DecryptionException: if the secret does not exist
+        """
         try:
             return cast(
                 str,
-                self.client_ro.get_secret_value(SecretId=ciphertext)["SecretString"],
+                self.client_ro.get_secret_value(SecretId=name)["SecretString"],
             )
         except self.client_ro.exceptions.ResourceNotFoundException as e:
             raise DecryptionException(e)
 
+    def _fetch(self, name: str) -> str:
+        """Read `name` from AWS through the negative cache and circuit breaker"""
+        if self.not_found.get(name):
+            raise DecryptionException(KeyError(name))
+        self.breaker.check()
+        try:
+            plaintext = self._get_value(name)
+        except DecryptionException:
+            # AWS answered, the secret just does not exist
+            self.breaker.success()
+            self.not_found.set(name, True)
+            raise
+        except Exception:
+            self.breaker.failure()
+            raise
+        self.breaker.success()
+        self._store({name: plaintext})
+        return plaintext
+
+    def _refresh_in_background(self, names: list[str]) -> None:
+        """Queue the stale `names` for refreshing, skipping those already queued"""
+        with self._refreshing_lock:
+            names = [name for name in names if name not in self._refreshing]
+            self._refreshing.update(names)
+        if names:
+            self._refresher.submit(self._refresh, names)
 
-def _get_client(role_arn: str | None = None) -> boto3.client:
-    """
-    Get boto3 client for AWS Secrets Manager
-    """
-    if role_arn:
-        sts_client = boto3.client("sts")
-        assumed_role_object = sts_client.assume_role(
-            RoleArn=role_arn, RoleSessionName=str(uuid.uuid4())
-        )
-        credentials = assumed_role_object["Credentials"]
-        session = boto3.Session(
-            aws_access_key_id=credentials["AccessKeyId"],
-            aws_secret_access_key=credentials["SecretAccessKey"],
-            aws_session_token=credentials["SessionToken"],
-        )
-        return session.client("secretsmanager")
-    else:
-        return boto3.client("secretsmanager")
+    def _refresh(self, names: list[str]) -> None:
+        try:
+            if len(names) == 1:
+                self._fetch(names[0])
+                return
+            size = self.batch_size
+            for i in range(0, len(names), size):
+                results = self._get_chunk(names[i : i + size])
+                values = {}
+                for name, value in results.items():
+                    if isinstance(value, str):
+                        values[name] = value
+                    else:
+                        logger.warning("Refreshing %s failed: %s", name, value)
+                self._store(values)
+        except Exception:
+            logger.warning("Refreshing %s failed", ", ".join(names), exc_info=True)
+        finally:
+            with self._refreshing_lock:
+                self._refreshing.difference_update(names)
+
+    def rotate(self, ciphertext: str) -> str:
+        """Secrets are encrypted by AWS, the stored name never changes"""
+        return ciphertext
+
+    def invalidate(self, ciphertext: str | None = None) -> None:
+        """Drop cached plaintext, the shared cache is only cleared for a single
+        ciphertext as it may hold entries of other backends"""
+        self.cache.invalidate(ciphertext)
+        self.not_found.invalidate(ciphertext)
+        if self.shared is not None and ciphertext is not None:
+            self.shared.delete(ciphertext)
+
+    def _cached(self, names: list[str]) -> dict[str, str]:
+        """Plaintext of the `names` found in the local or shared cache"""
+        observed = instrumentation.enabled()
+        results = {}
+        for name in names:
+            start = time.perf_counter() if observed else 0.0
+            plaintext = self.cache.get(name)
+            if plaintext is not None:
+                results[name] = plaintext
+            if observed:
+                self._record("cache", [name], results, time.perf_counter() - start)
+        if self.shared is not None:
+            missing = [name for name in names if name not in results]
+            if missing:
+                start = time.perf_counter() if observed else 0.0
+                shared = self.shared.get_many(missing)
+                for name, plaintext in shared.items():
+                    self.cache.set(name, plaintext)
+                results.update(shared)
+                if observed:
+                    # a single lookup, each name is reported with its duration
+                    duration = time.perf_counter() - start
+                    self._record("shared_cache", missing, shared, duration)
+        return results
+
+    def _record(
+        self, operation: str, names: list[str], found: dict[str, str], duration: float
+    ) -> None:
+        for name in names:
+            plaintext = found.get(name)
+            instrumentation.record(
+                operation,
+                self.alias,
+                duration,
+                len(plaintext.encode("utf-8")) if plaintext is not None else 0,
+                "hit" if plaintext is not None else "miss",
+            )
+
+    def _store(self, values: dict[str, str]) -> None:
+        for name, plaintext in values.items():
+            self.cache.set(name, plaintext)
+        if self.shared is not None:
+            self.shared.set_many(values)
+
+    def encrypt_many(self, plaintexts: list[str]) -> list[str | Exception]:
+        def encrypt(plaintext: str) -> str | Exception:
+            try:
+                return self.encrypt(plaintext)
+            except Exception as e:
+                return e
+
+        # the same plaintext is always stored under the same name
+        unique = list(dict.fromkeys(plaintexts))
+        results = dict(zip(unique, self._map(encrypt, unique)))
+        return [results[plaintext] for plaintext in plaintexts]
+
+    def decrypt_many(self, ciphertexts: list[str]) -> list[str | Exception]:
+        results = self._get_many(ciphertexts)
+        return [results[name] for name in ciphertexts]
+
+    def prefetch(self, ciphertexts: list[str]) -> dict[str, str]:
+        """Get many secrets from the backend using BatchGetSecretValue
+
+        Args:
+            ciphertexts (list[str]): the paths of the secrets in AWS Secrets Manager
+
+        Returns:
+            dict[str, str]: plaintext for each secret that was found
+        """
+        return {
+            name: value
+            for name, value in self._get_many(ciphertexts).items()
+            if isinstance(value, str)
+        }
+
+    def warm(self) -> int:
+        """Load every secret under `prefix` into the cache with BatchGetSecretValue
+
+        Returns:
+            int: number of secrets loaded
+        """
+        prefix = self.config.get("prefix", None)
+        if not prefix:
+            raise ValueError("DJANGO_SECRETS_FIELDS['backend']['prefix'] must be set")
+        kwargs = {"Filters": [{"Key": "name", "Values": [prefix]}]}
+        count = 0
+        while True:
+            response = self.client_ro.batch_get_secret_value(**kwargs)
+            values = {
+                value["Name"]: value["SecretString"]
+                for value in response["SecretValues"]
+                if "SecretString" in value
+            }
+            self._store(values)
+            for name in values:
+                self.known.set(name, True)
+            count += len(values)
+            if not response.get("NextToken"):
+                return count
+            kwargs["NextToken"] = response["NextToken"]
+
+    def _get_many(self, names: list[str]) -> dict[str, str | Exception]:
+        unique = list(dict.fromkeys(names))
+        results: dict[str, str | Exception] = dict(self._cached(unique))
+        missing = []
+        stale_names = []
+        for name in unique:
+            if name in results:
+                continue
+            stale = self.cache.get_stale(name)
+            if stale is not None:
+                results[name] = stale
+                stale_names.append(name)
+            elif self.not_found.get(name):
+                results[name] = DecryptionException(KeyError(name))
+            else:
+                missing.append(name)
+        if stale_names:
+            self._refresh_in_background(stale_names)
+
+        size = self.batch_size
+        chunks = [missing[i : i + size] for i in range(0, len(missing), size)]
+        for result in self._map(self._get_chunk, chunks):
+            self._store(
+                {
+                    name: value
+                    for name, value in result.items()
+                    if isinstance(value, str)
+                }
+            )
+            results.update(result)
+        return results
+
+    def _get_chunk(self, names: list[str]) -> dict[str, str | Exception]:
+        """`_batch_get` through the negative cache and circuit breaker"""
+        try:
+            self.breaker.check()
+        except CircuitOpenException as e:
+            return {name: e for name in names}
+        try:
+            results = self._batch_get(names)
+        except Exception as e:
+            self.breaker.failure()
+            return {name: e for name in names}
+        self.breaker.success()
+        for name, value in results.items():
+            if isinstance(value, DecryptionException):
+                self.not_found.set(name, True)
+        return results
+
+    def _batch_get(self, names: list[str]) -> dict[str, str | Exception]:
+        response = self.client_ro.batch_get_secret_value(SecretIdList=names)
+
+        results: dict[str, str | Exception] = {}
+        for value in response["SecretValues"]:
+            if "SecretString" in value:
+                results[value["Name"]] = value["SecretString"]
+        for error in response["Errors"]:
+            client_error = ClientError(
+                {"Error": {"Code": error["ErrorCode"], "Message": error["Message"]}},
+                "BatchGetSecretValue",
+            )
+            results[error["SecretId"]] = (
+                DecryptionException(client_error)
+                if error["ErrorCode"] == "ResourceNotFoundException"
+                else client_error
+            )
+        for name in names:
+            if name not in results:
+                results[name] = DecryptionException(KeyError(name))
+        return results
+
+    def _map(self, func: Callable[[A], R], items: list[A]) -> list[R]:
+        """Call `func` for each item using up to `batch_workers` threads"""
+        workers = min(int(self.config.get("batch_workers", 4)), len(items))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(func, items))
+        return [func(item) for item in items]
@@ -0,0 +1,161 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from cryptography import fernet
+from dataclasses import dataclass
+from django.core.cache import BaseCache, caches
+from django.core.exceptions import ImproperlyConfigured
+from typing import Generic, TypeVar
+
+DEFAULT_TTL = 30
+DEFAULT_MAXSIZE = 1024
+DEFAULT_SHARED_TTL = 300
+
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+    ttl: float | None
+
+
+class TTLCache(Generic[V]):
+    """Thread safe LRU cache where entries also expire after `ttl` seconds
+
+    A `ttl` of None means entries never expire and are only evicted when the
+    cache is full, a `ttl` or `maxsize` of 0 disables the cache. Expired entries
+    are kept for another `stale_ttl` seconds for `get_stale`.
+    """
+
+    def __init__(
+        self,
+        ttl: float | None = DEFAULT_TTL,
+        maxsize: int = DEFAULT_MAXSIZE,
+        stale_ttl: float = 0,
+    ):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float | None, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                expires, value = entry
+                now = time.monotonic()
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if expires + self.stale_ttl <= now:
+                    del self._entries[key]
+            self.misses += 1
+            return None
+
+    def get_stale(self, key: str) -> V | None:
+        """An expired value that is less than `stale_ttl` seconds past its expiry"""
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                expires, value = entry
+                if expires is not None and expires + self.stale_ttl > time.monotonic():
+                    return value
+            return None
+
+    def set(self, key: str, value: V) -> None:
+        if self.maxsize <= 0 or self.ttl == 0:
+            return
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str | None = None) -> None:
+        """Remove `key` from the cache, or every entry if no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self._entries),
+                maxsize=self.maxsize,
+                ttl=self.ttl,
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedCache:
+    """Decrypted values shared between processes through the Django cache `alias`
+
+    Values are encrypted with the Fernet `key` (or list of keys, the first is
+    used for new entries) before they are stored, so the cache server never
+    sees plaintext. Entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, alias: str, key: bytes | str | list | None, ttl: float | None):
+        if not key:
+            raise ImproperlyConfigured(
+                "DJANGO_SECRETS_FIELDS['shared_cache_key'] must be set"
+            )
+        keys = key if isinstance(key, (list, tuple)) else [key]
+        self.alias = alias
+        self.ttl = ttl
+        self._crypter = fernet.MultiFernet([fernet.Fernet(k) for k in keys])
+
+    @property
+    def cache(self) -> BaseCache:
+        return caches[self.alias]
+
+    @staticmethod
+    def _key(name: str) -> str:
+        # names can be longer than or contain characters memcached does not allow
+        return f"secrets_fields:{hashlib.sha256(name.encode('utf-8')).hexdigest()}"
+
+    def get_many(self, names: list[str]) -> dict[str, str]:
+        keys = {self._key(name): name for name in names}
+        results = {}
+        for key, token in self.cache.get_many(list(keys)).items():
+            try:
+                results[keys[key]] = self._crypter.decrypt(token).decode("utf-8")
+            except fernet.InvalidToken:
+                # written with a key that is no longer configured
+                continue
+        return results
+
+    def get(self, name: str) -> str | None:
+        return self.get_many([name]).get(name, None)
+
+    def set_many(self, values: dict[str, str]) -> None:
+        if values:
+            self.cache.set_many(
+                {
+                    self._key(name): self._crypter.encrypt(value.encode("utf-8"))
+                    for name, value in values.items()
+                },
+                timeout=self.ttl,
+            )
+
+    def set(self, name: str, value: str) -> None:
+        self.set_many({name: value})
+
+    def delete(self, name: str) -> None:
+        self.cache.delete(self._key(name))
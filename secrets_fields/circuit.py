@@ -0,0 +1,63 @@
+import threading
+import time
+from .exceptions import CircuitOpenException
+
+DEFAULT_RESET_TIMEOUT = 30
+
+
+class CircuitBreaker:
+    """Stop calling a failing service after `threshold` consecutive errors
+
+    Once open, calls fail fast with `CircuitOpenException` for `reset_timeout`
+    seconds, then a single call is let through and closes the circuit again if
+    it succeeds. A `threshold` of 0 disables the breaker.
+    """
+
+    def __init__(
+        self, threshold: int = 0, reset_timeout: float = DEFAULT_RESET_TIMEOUT
+    ):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def check(self) -> None:
+        """Raise `CircuitOpenException` if the service should not be called
+
+        Raises:
+            CircuitOpenException: if the circuit is open
+        """
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if (
+                not self._trial
+                and time.monotonic() >= self._opened_at + self.reset_timeout
+            ):
+                # let one call through to see if the service has recovered
+                self._trial = True
+                return
+            raise CircuitOpenException()
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+                self._trial = False
@@ -0,0 +1,50 @@
+"""
+Compression of large plaintexts before they are encrypted
+
+Compressed values are stored with the version `v1+<algorithm>`, the compressed
+bytes are base85 encoded as backends encrypt strings.
+"""
+
+import base64
+import zlib
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ALGORITHMS = ("zlib", "zstd")
+DEFAULT_THRESHOLD = 1024
+
+
+def compress(value: str, algorithm: str) -> str:
+    data = value.encode("utf-8")
+    if algorithm == "zlib":
+        compressed = zlib.compress(data)
+    elif algorithm == "zstd":
+        if zstandard is None:
+            raise ImproperlyConfigured(
+                "zstandard is required for zstd compression - pip install zstandard"
+            )
+        compressed = zstandard.ZstdCompressor().compress(data)
+    else:
+        raise ImproperlyConfigured(
+            f"DJANGO_SECRETS_FIELDS['compression'] must be one of {', '.join(ALGORITHMS)}"
+        )
+    return base64.b85encode(compressed).decode("ascii")
+
+
+def decompress(value: str, algorithm: str) -> str:
+    data = base64.b85decode(value)
+    if algorithm == "zlib":
+        decompressed = zlib.decompress(data)
+    elif algorithm == "zstd":
+        if zstandard is None:
+            raise ImproperlyConfigured(
+                "zstandard is required to read zstd compressed values - pip install zstandard"
+            )
+        decompressed = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raise ValueError(f"Unknown compression {algorithm}")
+    return decompressed.decode("utf-8")
@@ -4,3 +4,10 @@ class DecryptionException(Exception):
 
     def __str__(self) -> str:
         return f"Decryption failed: {str(self.cause)}"
+
+
+class CircuitOpenException(Exception):
+    """The backend failed repeatedly and is not called until it recovers"""
+
+    def __str__(self) -> str:
+        return "Backend unavailable, too many consecutive errors"
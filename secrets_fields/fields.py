@@ -2,32 +2,64 @@
 Django encrypted model field that fetches the value from AWS Secrets Manager
 """
 
+import hashlib
 import json
+import threading
 import warnings
 import django.db.models
+from contextlib import contextmanager
+from . import instrumentation
+from .compression import DEFAULT_THRESHOLD, compress, decompress
+from .backends.backends import BaseSecretsBackend
 from .util import get_backend
 from secrets_fields.exceptions import DecryptionException
-from dataclasses import dataclass
-from typing import Any, TypeVar, Type, cast, Generic
+from typing import Any, Iterator, TypeVar, Type, cast, Generic
 from django.conf import settings
-from django.db.models import Model
+from django.db.models import Model, signals
+from django.db.models.expressions import Col
+from django.db.models.lookups import Exact
+from django.db.models.query_utils import DeferredAttribute
 from .types import JSON
 from .widgets import JSONWidget
 from django.forms import Field, ChoiceField
 
 
-TTL = 30
+T = TypeVar("T")
 
+# prefixes of values in the current format, anything else needs migrating
+VERSION_PREFIXES = ("v1|", "v1+zlib|", "v1+zstd|")
 
-@dataclass
-class Cache:
-    ttl: float
-    value: str
+_deferred = threading.local()
 
 
-cache: dict[str, Cache] = {}
+@contextmanager
+def deferred_decryption() -> Iterator[None]:
+    """Fields that decrypt when loaded return the secret object instead"""
+    previous = getattr(_deferred, "active", False)
+    _deferred.active = True
+    try:
+        yield
+    finally:
+        _deferred.active = previous
 
-T = TypeVar("T")
+
+_pre_encrypted = threading.local()
+
+
+@contextmanager
+def pre_encrypted(ciphertexts: dict[tuple[str, str], str]) -> Iterator[None]:
+    """Use ciphertexts encrypted ahead of time instead of asking the backend
+
+    Args:
+        ciphertexts (dict[tuple[str, str], str]): backend ciphertext keyed by
+            backend alias and encoded plaintext
+    """
+    previous = getattr(_pre_encrypted, "ciphertexts", None)
+    _pre_encrypted.ciphertexts = ciphertexts
+    try:
+        yield
+    finally:
+        _pre_encrypted.ciphertexts = previous
 
 
 class SecretBase(Generic[T]):
@@ -37,25 +69,95 @@ class SecretBase(Generic[T]):
         backend: str = "default",
         plaintext: T | None = None,
         ciphertext: str | None = None,
+        field: "django.db.models.Field[Any, Any] | None" = None,
     ):
+        """
+        Args:
+            field (django.db.models.Field | None): the model field the secret
+                belongs to, passed on to instrumentation observers
+        """
         self.ciphertext = ciphertext
         self._plaintext = plaintext
-        self._backend = get_backend(backend)
+        self._alias = backend
+        self._field = field
         if not self.ciphertext and self._plaintext:
-            self.ciphertext = self._backend.encrypt(
-                self.prepare_ciphertext(self._plaintext)
-            )
+            version, prepared = self.encode(self._plaintext)
+            ciphertexts = getattr(_pre_encrypted, "ciphertexts", None) or {}
+            self.ciphertext = ciphertexts.get((backend, prepared))
+            if self.ciphertext is None:
+                self.ciphertext = instrumentation.call(
+                    "encrypt", backend, self._backend.encrypt, prepared, field
+                )
             # prepend version
-            self.ciphertext = f"v1|{self.ciphertext}"
+            self.ciphertext = f"{version}|{self.ciphertext}"
+
+    @property
+    def _backend(self) -> BaseSecretsBackend:
+        # resolved on use rather than kept, backends hold locks and clients so
+        # instances with secrets could not be pickled or deep copied
+        return get_backend(self._alias)
 
     def prepare_ciphertext(self, value: T) -> str:
         """Prepare the plaintext for encryption"""
         return cast(str, value)
 
+    def encode(self, value: T) -> tuple[str, str]:
+        """Version and string to encrypt for `value`
+
+        Values of at least `compression_threshold` characters (default 1024) are
+        compressed when the backend config sets `compression` to zlib or zstd.
+        """
+        prepared = self.prepare_ciphertext(value)
+        algorithm = self._backend.config.get("compression", None)
+        threshold = self._backend.config.get("compression_threshold", DEFAULT_THRESHOLD)
+        if algorithm and len(prepared) >= threshold:
+            return f"v1+{algorithm}", compress(prepared, algorithm)
+        return "v1", prepared
+
     def to_python(self, value: Any) -> T:
         """Convert the decrypted ciphertext to a python object"""
         return cast(T, value)
 
+    def prepare_index(self, value: T) -> str:
+        """Prepare the plaintext for the blind index, equal values must match"""
+        return self.prepare_ciphertext(value)
+
+    @property
+    def ciphertext(self) -> str | None:
+        return self._ciphertext
+
+    @ciphertext.setter
+    def ciphertext(self, value: str | None) -> None:
+        self._ciphertext = value
+        # anything decrypted belongs to the previous ciphertext
+        self._prefetched: str | None = None
+        self._decrypted: T | None = None
+        self._digest: str | None = None
+        self._is_decrypted = False
+
+    def __getstate__(self) -> dict[str, Any]:
+        # pickled instances end up in caches, so only the ciphertext is kept and
+        # the value is decrypted again when read
+        state = self.__dict__.copy()
+        for name in (
+            "_plaintext",
+            "_prefetched",
+            "_decrypted",
+            "_digest",
+            "_is_decrypted",
+        ):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._plaintext = None
+        self.ciphertext = state["_ciphertext"]
+
+    def prime(self, plaintext: str) -> None:
+        """Use `plaintext` fetched ahead of time instead of asking the backend"""
+        self._prefetched = plaintext
+
     @property
     def plaintext(self) -> T | None:
         return self.get()
@@ -66,21 +168,66 @@ class SecretBase(Generic[T]):
     def __repr__(self) -> str:
         return cast(str, self.get())
 
-    def get(self) -> T | None:
+    def get(self, refresh: bool = False) -> T | None:
+        """Decrypt the secret, the result is kept for later calls
+
+        Args:
+            refresh (bool): ignore any value decrypted or cached earlier and read
+                it from the backend again
+        """
+        if self._is_decrypted and not refresh:
+            return self._decrypted
+        if refresh:
+            self._prefetched = None
+            if self.ciphertext is not None:
+                self._backend.invalidate(self.ciphertext.split("|")[-1])
+        self._decrypted = self._decrypt()
+        self._digest = self._hash(self._decrypted)
+        self._is_decrypted = True
+        return self._decrypted
+
+    def _hash(self, value: T | None) -> str | None:
+        if value is None:
+            return None
+        prepared = self.prepare_ciphertext(value)
+        return hashlib.sha256(prepared.encode("utf-8")).hexdigest()
+
+    @property
+    def is_dirty(self) -> bool:
+        """The decrypted value no longer matches the stored ciphertext
+
+        Either it was modified in place or the ciphertext is in a legacy format,
+        in both cases the value has to be encrypted again when saved.
+        """
+        if not self._is_decrypted or self.ciphertext is None:
+            return False
+        if not self.ciphertext.startswith(VERSION_PREFIXES):
+            return True
+        return self._hash(self._decrypted) != self._digest
+
+    def _call_decrypt(self, ciphertext: str) -> str:
+        return instrumentation.call(
+            "decrypt", self._alias, self._backend.decrypt, ciphertext, self._field
+        )
+
+    def _decrypt(self) -> T | None:
         if self.ciphertext is None:
             return None
         components = self.ciphertext.split("|")
-        valid_cipertext = len(components) == 2 and components[0] == "v1"
+        valid_cipertext = len(components) == 2 and (
+            f"{components[0]}|" in VERSION_PREFIXES
+        )
         try:
             if len(components) == 1:
-                plaintext = self._backend.decrypt(self.ciphertext)
+                plaintext = self._call_decrypt(self.ciphertext)
                 warnings.warn(
                     "This field needs migrating to the new format.",
                     UserWarning,
                 )
+            elif self._prefetched is not None:
+                plaintext = self._prefetched
             else:
-                ciphertext = components[-1]
-                plaintext = self._backend.decrypt(ciphertext)
+                plaintext = self._call_decrypt(components[-1])
         except DecryptionException:
             if not valid_cipertext and getattr(
                 settings, "DJANGO_SECRETS_FIELDS_MIGRATE", False
@@ -103,6 +250,9 @@ class SecretBase(Generic[T]):
                 )
                 raise
         else:
+            algorithm = components[0].partition("+")[2]
+            if len(components) == 2 and algorithm:
+                plaintext = decompress(plaintext, algorithm)
             return self.to_python(plaintext)
 
 
@@ -115,14 +265,66 @@ TF = TypeVar("TF", bound=SecretBase[Any])
 
 class SecretField(django.db.models.TextField, Generic[TF]):
     attname: str
+    # from_db_value decrypts the value as soon as the row is loaded
+    decrypts_on_load = False
 
     def __init__(
-        self, secret_type: Type[TF], backend: str = "default", *args: Any, **kwargs: Any
+        self,
+        secret_type: Type[TF],
+        backend: str = "default",
+        *args: Any,
+        blind_index: bool = False,
+        **kwargs: Any,
     ):
+        """
+        Args:
+            blind_index (bool): keep a keyed hash of the value in an indexed
+                `<name>_index` column so `filter(<name>=value)` is a single
+                indexed query, requires `blind_index_key` in the backend config
+        """
         self.secret_type = secret_type
         self.backend = backend
+        self.blind_index = blind_index
         super().__init__(*args, **kwargs)
 
+    @property
+    def index_name(self) -> str:
+        return f"{self.name}_index"
+
+    def contribute_to_class(
+        self, cls: type[Model], name: str, private_only: bool = False
+    ) -> None:
+        super().contribute_to_class(cls, name, private_only=private_only)
+        # abstract models pass a copy of this field to each subclass
+        if self.blind_index and not cls._meta.abstract:
+            cls.add_to_class(self.index_name, BlindIndexField(source=name))
+            signals.pre_save.connect(self.check_update_fields, sender=cls)
+
+    def check_update_fields(
+        self, update_fields: frozenset[str] | None = None, **kwargs: Any
+    ) -> None:
+        """
+        Refuse `save(update_fields=...)` naming this field but not its blind
+        index, the index is only recomputed when it is saved too
+        """
+        if (
+            update_fields is not None
+            and self.name in update_fields
+            and self.index_name not in update_fields
+        ):
+            raise ValueError(
+                f"update_fields must include {self.index_name} with {self.name}"
+            )
+
+    def index_value(self, value: Any) -> str | None:
+        """Blind index of `value`, None for values that are stored as NULL"""
+        if isinstance(value, SecretBase):
+            value = value.get()
+        if not value:
+            return None
+        secret = self.secret_type(backend=self.backend)
+        return get_backend(self.backend).blind_index(secret.prepare_index(value))
+
     def formfield(
         self,
         form_class: type[Field] | None = None,
@@ -141,14 +343,74 @@ class SecretField(django.db.models.TextField, Generic[TF]):
         # if not self.secret_type we need to convert to self.secret_type and encrypt it
         if value is None:
             return None
+        # an unchanged secret keeps its ciphertext, no need to encrypt it again
+        if isinstance(value, SecretBase) and value.is_dirty:
+            value = value.get()
         if not isinstance(value, SecretBase):
-            value = self.secret_type(plaintext=value, backend=self.backend)
+            value = self.secret_type(plaintext=value, backend=self.backend, field=self)
         return value.ciphertext
 
     def get_internal_type(self) -> str:
         return "TextField"
 
 
+class BlindIndexField(django.db.models.CharField):
+    """Blind index of the secret field `source`, added by `SecretField(blind_index=True)`"""
+
+    def __init__(self, *args: Any, source: str, **kwargs: Any):
+        self.source = source
+        kwargs.setdefault("max_length", 64)
+        kwargs.setdefault("null", True)
+        kwargs.setdefault("editable", False)
+        kwargs.setdefault("db_index", True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self) -> Any:
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["source"] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance: Model, add: bool) -> Any:
+        source = cast(SecretField[Any], model_instance._meta.get_field(self.source))
+        if source.attname not in model_instance.__dict__:
+            # deferred and not saved
+            return getattr(model_instance, self.attname)
+
+        value = model_instance.__dict__[source.attname]
+        current = getattr(model_instance, self.attname)
+        # an unchanged secret keeps its index, no need to decrypt it
+        if isinstance(value, SecretBase) and not value.is_dirty:
+            if current is not None or value.ciphertext is None:
+                return current
+
+        index = source.index_value(value)
+        setattr(model_instance, self.attname, index)
+        return index
+
+
+@SecretField.register_lookup
+class SecretExact(Exact):
+    """`exact` on a field with a blind index compares the index instead"""
+
+    def __init__(self, lhs: Any, rhs: Any):
+        field = getattr(lhs, "target", None)
+        if (
+            isinstance(field, SecretField)
+            and field.blind_index
+            and isinstance(lhs, Col)
+            and not hasattr(rhs, "resolve_expression")
+        ):
+            index = field.index_value(rhs)
+            if index is not None:
+                index_field = cast(
+                    "django.db.models.Field[Any, Any]",
+                    field.model._meta.get_field(field.index_name),
+                )
+                lhs = Col(lhs.alias, index_field)
+                rhs = index
+        super().__init__(lhs, rhs)
+
+
 class SecretTextField(SecretField[SecretText]):
     def __init__(self, *args: Any, **kwargs: Any):
         super().__init__(SecretText, *args, **kwargs)
@@ -156,7 +418,7 @@ class SecretTextField(SecretField[SecretText]):
     def from_db_value(
         self, ciphertext: str, expression: str | None, connection: Any
     ) -> SecretText:
-        return self.secret_type(ciphertext=ciphertext, backend=self.backend)
+        return self.secret_type(ciphertext=ciphertext, backend=self.backend, field=self)
 
 
 class SecretJSON(SecretBase[JSON]):
@@ -166,15 +428,89 @@ class SecretJSON(SecretBase[JSON]):
     def to_python(self, value: str) -> JSON:
         return cast(JSON, json.loads(value))
 
+    def prepare_index(self, value: JSON) -> str:
+        # the same keys in any order are the same value
+        return json.dumps(value, sort_keys=True)
+
+    def __str__(self) -> str:
+        return str(self.get())
+
+    def __repr__(self) -> str:
+        return repr(self.get())
+
+
+class SecretCol(Col):
+    """Column of a SecretJSONField that knows whether it loads model instances
+
+    `values()` and `values_list()` select their own columns rather than the
+    default ones, their rows get the decoded JSON instead of the secret.
+    """
+
+    loads_instances = False
+
+    def select_format(self, compiler: Any, sql: Any, params: Any) -> Any:
+        self.loads_instances = compiler.query.default_cols
+        return super().select_format(compiler, sql, params)
+
+
+class SecretJSONDescriptor(DeferredAttribute):
+    """
+    Decrypts values that were loaded from the database on first access, the
+    secret stays on the instance so an unchanged value is not encrypted again
+    when saved
+    """
+
+    def __get__(self, instance: Model | None, cls: type[Model] | None = None) -> Any:
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, SecretBase):
+            return value.get()
+        return value
+
+    def __set__(self, instance: Model, value: Any) -> None:
+        instance.__dict__[self.field.attname] = value
+
 
 class SecretJSONField(SecretField[SecretJSON]):
-    def __init__(self, *args: Any, **kwargs: Any):
+    decrypts_on_load = True
+    descriptor_class = SecretJSONDescriptor
+
+    def __init__(self, *args: Any, lazy: bool = False, **kwargs: Any):
+        """
+        Args:
+            lazy (bool): defer decryption until the field is first accessed
+                rather than when the row is loaded
+        """
+        self.lazy = lazy
+        self.decrypts_on_load = not lazy
         super().__init__(SecretJSON, *args, **kwargs)
 
-    def from_db_value(
-        self, ciphertext: str, expression: str | None, connection: Any
-    ) -> Any:
-        return self.secret_type(ciphertext=ciphertext, backend=self.backend).get()
+    def get_col(self, alias: str, output_field: Any = None) -> Col:
+        # a new column for every query as SecretCol is updated when compiled
+        return SecretCol(alias, self, output_field)
+
+    def from_db_value(self, ciphertext: str, expression: Any, connection: Any) -> Any:
+        """Model instances keep the secret so it can be decrypted lazily and
+        saved without encrypting it again, other rows get the decoded JSON"""
+        secret = self.secret_type(
+            ciphertext=ciphertext, backend=self.backend, field=self
+        )
+        if getattr(_deferred, "active", False):
+            return secret
+        if not getattr(expression, "loads_instances", False):
+            return secret.get()
+        if not self.lazy:
+            secret.get()
+        return secret
+
+    def pre_save(self, model_instance: Model, add: bool) -> Any:
+        # the descriptor returns the decoded value, save the secret itself when
+        # it is unchanged so its ciphertext is reused
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, SecretBase) and not value.is_dirty:
+            return value
+        return super().pre_save(model_instance, add)
 
     def to_python(self, value: str | JSON | None) -> JSON | None:
         if isinstance(value, str):
@@ -187,3 +523,44 @@ class SecretJSONField(SecretField[SecretJSON]):
     def value_from_object(self, obj: Model) -> str:
         value = getattr(obj, self.attname)
         return json.dumps(value)
+
+
+# first byte of values stored by SecretBinaryField
+BINARY_VERSION = b"\x01"
+
+
+class SecretBinaryField(django.db.models.BinaryField):
+    """Binary secret stored as raw ciphertext bytes in a binary column
+
+    Values are `bytes` and are decrypted when the row is loaded, the stored
+    value is a version byte followed by the backend's `encrypt_bytes` output.
+    """
+
+    def __init__(self, *args: Any, backend: str = "default", **kwargs: Any):
+        self.backend = backend
+        super().__init__(*args, **kwargs)
+
+    def from_db_value(
+        self, value: bytes | memoryview | None, expression: Any, connection: Any
+    ) -> bytes | None:
+        if value is None:
+            return None
+        value = bytes(value)
+        if value[:1] != BINARY_VERSION:
+            raise DecryptionException(ValueError("Unknown binary secret version"))
+        return instrumentation.call(
+            "decrypt",
+            self.backend,
+            get_backend(self.backend).decrypt_bytes,
+            value[1:],
+            self,
+        )
+
+    def get_prep_value(self, value: Any) -> bytes | None:
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        backend = get_backend(self.backend)
+        return BINARY_VERSION + instrumentation.call(
+            "encrypt", self.backend, backend.encrypt_bytes, bytes(value), self
+        )
@@ -0,0 +1,155 @@
+"""
+Observers notified of every encrypt, decrypt and cache lookup
+
+An observer is any callable taking an `Event`, register it with `add_observer`
+or list import paths in the `DJANGO_SECRETS_FIELDS_OBSERVERS` setting. With no
+observers registered an operation costs one extra function call.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from django.conf import settings
+from django.db.models import Field, Model
+from django.utils.module_loading import import_string
+from typing import Any, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+A = TypeVar("A")
+R = TypeVar("R")
+
+
+@dataclass
+class Event:
+    # encrypt, decrypt, encrypt_many, prefetch, cache or shared_cache
+    operation: str
+    # backend alias, None for backends not built by `get_backend`
+    backend: str | None
+    # `app_label.Model` and field name, when the operation is for a field
+    model: str | None
+    field: str | None
+    # seconds taken
+    duration: float
+    # bytes of plaintext encrypted, decrypted or found in the cache
+    size: int
+    # ok or error, hit or miss for cache lookups
+    outcome: str
+    error: Exception | None = None
+
+
+Observer = Callable[[Event], None]
+
+# replaced rather than modified so it can be read without the lock
+_observers: tuple[Observer, ...] = ()
+_observers_lock = threading.Lock()
+
+
+def add_observer(observer: Observer) -> None:
+    global _observers
+    with _observers_lock:
+        if observer not in _observers:
+            _observers = (*_observers, observer)
+
+
+def remove_observer(observer: Observer) -> None:
+    global _observers
+    with _observers_lock:
+        _observers = tuple(o for o in _observers if o != observer)
+
+
+def enabled() -> bool:
+    """At least one observer is registered"""
+    return bool(_observers)
+
+
+def load_observers() -> None:
+    """Register the observers listed in `DJANGO_SECRETS_FIELDS_OBSERVERS`
+
+    Each entry is the import path of an observer class, which is instantiated
+    without arguments, or of an observer function.
+    """
+    for path in getattr(settings, "DJANGO_SECRETS_FIELDS_OBSERVERS", None) or []:
+        observer = import_string(path)
+        if isinstance(observer, type):
+            observer = observer()
+        add_observer(observer)
+
+
+def _size(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_size(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(_size(v) for v in value)
+    # exceptions in the results of bulk operations
+    return 0
+
+
+def _names(source: Field | type[Model] | None) -> tuple[str | None, str | None]:
+    if isinstance(source, Field):
+        model = getattr(source, "model", None)
+        return (model._meta.label if model else None), source.name
+    if source is not None:
+        return source._meta.label, None
+    return None, None
+
+
+def notify(event: Event) -> None:
+    for observer in _observers:
+        try:
+            observer(event)
+        except Exception:
+            # instrumentation must never break reading a secret
+            logger.exception("Observer %r failed", observer)
+
+
+def record(
+    operation: str,
+    backend: str | None,
+    duration: float,
+    size: int,
+    outcome: str,
+    source: Field | type[Model] | None = None,
+) -> None:
+    """Notify observers of an operation timed by the caller"""
+    if not _observers:
+        return
+    model, field = _names(source)
+    notify(Event(operation, backend, model, field, duration, size, outcome))
+
+
+def call(
+    operation: str,
+    backend: str | None,
+    func: Callable[[A], R],
+    arg: A,
+    source: Field | type[Model] | None = None,
+) -> R:
+    """Call `func(arg)` and notify observers of how long it took
+
+    The size is that of `arg` for encrypt operations and of the result
+    otherwise, so it is always the plaintext.
+
+    Args:
+        source (Field | type[Model] | None): the field or model the operation is for
+    """
+    if not _observers:
+        return func(arg)
+
+    model, field = _names(source)
+    start = time.perf_counter()
+    try:
+        result = func(arg)
+    except Exception as e:
+        duration = time.perf_counter() - start
+        notify(Event(operation, backend, model, field, duration, 0, "error", e))
+        raise
+    duration = time.perf_counter() - start
+    size = _size(arg if operation.startswith("encrypt") else result)
+    notify(Event(operation, backend, model, field, duration, size, "ok"))
+    return result
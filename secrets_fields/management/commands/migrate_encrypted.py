@@ -1,31 +1,199 @@
-from django.apps import apps
-from django.core.management.base import BaseCommand
-from secrets_fields.fields import SecretField
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections, router, transaction
+from django.db.models import IntegerField, Model, TextField, Value
+from secrets_fields.fields import VERSION_PREFIXES, SecretBase, SecretField
+from secrets_fields.management.utils import (
+    Checkpoint,
+    iter_batches,
+    legacy_filter,
+    pk_ranges,
+    secret_models,
+)
 from typing import Any
 
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class Task:
+    model: type[Model]
+    fields: list[SecretField]
+    # checkpoint key, the model label or the label and primary key range
+    key: str
+    pk_range: tuple[int, int] | None = None
+
+
+@dataclass
+class Outcome:
+    task: Task
+    updated: int = 0
+    error: Exception | None = None
+
 
 class Command(BaseCommand):
     help = "Migrate existing plaintext fields to encrypted fields"
 
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Number of rows updated per query (default {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            metavar="APP_LABEL.MODEL",
+            help="Only migrate this model, can be given multiple times",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File recording progress, an interrupted run continues from it",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the number of rows that need migrating",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Split each model into primary key ranges migrated concurrently",
+        )
+
     def handle(self, *args: Any, **options: Any) -> None:
+        batch_size = options.get("batch_size") or DEFAULT_BATCH_SIZE
+        workers = options.get("workers") or 1
+        checkpoint = Checkpoint(options.get("checkpoint"))
+        self._output_lock = threading.Lock()
         total_updated = 0
 
-        # Get all models with a secret field
-        for model in apps.get_models():
-            secret_fields = [
-                field.name
-                for field in model._meta.fields
-                if isinstance(field, SecretField)
+        if options.get("dry_run"):
+            for model, fields in secret_models(options.get("models")):
+                count = model._base_manager.filter(legacy_filter(fields)).count()
+                total_updated += count
+                self.stdout.write(f"{model._meta.label}: {count} rows need migrating")
+            self.stdout.write(f"{total_updated} records need migrating")
+            return
+
+        tasks = []
+        for model, fields in secret_models(options.get("models")):
+            tasks.extend(self.plan(model, fields, workers, checkpoint))
+
+        if workers == 1:
+            outcomes = [
+                Outcome(task, self.migrate(task, batch_size, checkpoint))
+                for task in tasks
             ]
-            if not secret_fields:
-                continue
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                outcomes = list(
+                    executor.map(
+                        lambda task: self.run_task(task, batch_size, checkpoint), tasks
+                    )
+                )
 
-            # Fetch and re-save all model instances
-            for instance in model.objects.all():
-                # mark the secret_fields list as updated
-                instance.save(update_fields=secret_fields)
-                total_updated += 1
+        failed = [outcome for outcome in outcomes if outcome.error is not None]
+        total_updated = sum(outcome.updated for outcome in outcomes)
+        for outcome in failed:
+            self.stderr.write(f"{outcome.task.key}: failed: {outcome.error}")
+        if failed:
+            raise CommandError(
+                f"Updated {total_updated} records, {len(failed)} of {len(tasks)} "
+                "ranges failed, run again to retry them"
+            )
 
+        checkpoint.clear()
         self.stdout.write(
             self.style.SUCCESS(f"Successfully updated {total_updated} records")
         )
+
+    def plan(
+        self,
+        model: type[Model],
+        fields: list[SecretField],
+        workers: int,
+        checkpoint: Checkpoint,
+    ) -> list[Task]:
+        """Split the model into tasks, one per primary key range when parallel"""
+        label = model._meta.label
+        if workers == 1 or not isinstance(model._meta.pk, IntegerField):
+            return [Task(model, fields, label)]
+
+        # a resumed run keeps the ranges of the interrupted one
+        ranges = checkpoint.ranges(label)
+        if not ranges:
+            queryset = model._base_manager.filter(legacy_filter(fields))
+            ranges = pk_ranges(queryset, workers)
+            for start, end in ranges:
+                checkpoint.set(Checkpoint.range_key(label, start, end), None)
+        return [
+            Task(model, fields, Checkpoint.range_key(label, start, end), (start, end))
+            for start, end in ranges
+        ]
+
+    def run_task(self, task: Task, batch_size: int, checkpoint: Checkpoint) -> Outcome:
+        """Migrate one task on a worker thread, errors are returned in the outcome"""
+        outcome = Outcome(task)
+        try:
+            outcome.updated = self.migrate(task, batch_size, checkpoint)
+        except Exception as e:
+            outcome.error = e
+        finally:
+            # each worker thread has its own database connections
+            connections.close_all()
+        return outcome
+
+    def migrate(self, task: Task, batch_size: int, checkpoint: Checkpoint) -> int:
+        model = task.model
+        field_names = [field.name for field in task.fields]
+        # bulk_update on the base manager does not update the blind indexes
+        field_names += [field.index_name for field in task.fields if field.blind_index]
+        using = router.db_for_write(model)
+        updated = 0
+        started = time.monotonic()
+
+        # only rows that are not already in the current format or lack a blind index
+        queryset = model._base_manager.using(using).filter(legacy_filter(task.fields))
+        if task.pk_range is not None:
+            start, end = task.pk_range
+            queryset = queryset.filter(pk__gte=start, pk__lte=end)
+
+        for batch in iter_batches(queryset, batch_size, checkpoint.get(task.key)):
+            for instance in batch:
+                for field in task.fields:
+                    secret = instance.__dict__.get(field.attname)
+                    plaintext = secret
+                    ciphertext = None
+                    if isinstance(secret, SecretBase):
+                        plaintext = secret.get()
+                        ciphertext = secret.ciphertext
+                    if ciphertext and ciphertext.startswith(VERSION_PREFIXES):
+                        # already current, written back as is
+                        value: Any = Value(ciphertext, output_field=TextField())
+                    else:
+                        # a plain value is encrypted again when saved
+                        value = plaintext
+                    setattr(instance, field.attname, value)
+                    if field.blind_index:
+                        setattr(
+                            instance, field.index_name, field.index_value(plaintext)
+                        )
+
+            with transaction.atomic(using=using):
+                model._base_manager.using(using).bulk_update(batch, field_names)
+            checkpoint.set(task.key, batch[-1].pk)
+
+            updated += len(batch)
+            elapsed = time.monotonic() - started
+            with self._output_lock:
+                self.stdout.write(
+                    f"{task.key}: {updated} rows updated ({updated / max(elapsed, 0.001):.0f} rows/s)"
+                )
+        return updated
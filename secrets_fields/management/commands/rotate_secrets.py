@@ -0,0 +1,176 @@
+import time
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import router, transaction
+from django.db.models import BinaryField, ExpressionWrapper, F, Model, TextField, Value
+from secrets_fields.exceptions import DecryptionException
+from secrets_fields.fields import (
+    BINARY_VERSION,
+    SecretBase,
+    SecretBinaryField,
+    SecretField,
+    deferred_decryption,
+)
+from secrets_fields.management.utils import Checkpoint, iter_batches, secret_models
+from secrets_fields.util import get_backend
+from typing import Any
+
+DEFAULT_BATCH_SIZE = 1000
+
+# prefix of the annotations holding the stored bytes of binary fields
+STORED = "_stored_"
+
+
+class Command(BaseCommand):
+    help = "Re-encrypt secret fields with the current encryption key"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Number of rows read per query (default {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            metavar="APP_LABEL.MODEL",
+            help="Only rotate this model, can be given multiple times",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File recording progress, an interrupted run continues from it",
+        )
+        parser.add_argument(
+            "--max-rows-per-second",
+            type=float,
+            help="Sleep between batches to stay under this rate",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        batch_size = options.get("batch_size") or DEFAULT_BATCH_SIZE
+        max_rate = options.get("max_rows_per_second")
+        checkpoint = Checkpoint(options.get("checkpoint"))
+        total_rotated = 0
+
+        for model, fields in secret_models(options.get("models"), binary=True):
+            total_rotated += self.rotate_model(
+                model, fields, batch_size, checkpoint, max_rate
+            )
+
+        checkpoint.clear()
+        self.stdout.write(
+            self.style.SUCCESS(f"Successfully rotated {total_rotated} records")
+        )
+
+    def rotate_model(
+        self,
+        model: type[Model],
+        fields: list[SecretField | SecretBinaryField],
+        batch_size: int,
+        checkpoint: Checkpoint,
+        max_rate: float | None,
+    ) -> int:
+        label = model._meta.label
+        using = router.db_for_write(model)
+        scanned = 0
+        rotated = 0
+        started = time.monotonic()
+
+        queryset = model._base_manager.using(using)
+        # only the primary keys are read ahead, each batch is selected again
+        # and locked before it is rotated so concurrent writes are not reverted
+        pks = queryset.only("pk")
+        binary = [
+            field.name for field in fields if isinstance(field, SecretBinaryField)
+        ]
+        if binary:
+            # binary fields decrypt when loaded, read the stored bytes instead
+            queryset = queryset.defer(*binary).annotate(
+                **{
+                    STORED + name: ExpressionWrapper(
+                        F(name), output_field=BinaryField()
+                    )
+                    for name in binary
+                }
+            )
+        # load the secrets without decrypting them, only the ciphertext is needed
+        with deferred_decryption():
+            for batch in iter_batches(pks, batch_size, checkpoint.get(label)):
+                with transaction.atomic(using=using):
+                    locked = queryset.select_for_update().filter(
+                        pk__in=[instance.pk for instance in batch]
+                    )
+                    changed = [
+                        instance
+                        for instance in locked.order_by("pk")
+                        if self.rotate(instance, fields)
+                    ]
+                    if changed:
+                        model._base_manager.using(using).bulk_update(
+                            changed, [field.name for field in fields]
+                        )
+                checkpoint.set(label, batch[-1].pk)
+
+                scanned += len(batch)
+                rotated += len(changed)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{label}: {scanned} rows scanned, {rotated} rotated "
+                    f"({scanned / max(elapsed, 0.001):.0f} rows/s)"
+                )
+                if max_rate:
+                    # throttle so the average rate stays under max_rate
+                    time.sleep(max(scanned / max_rate - elapsed, 0))
+        return rotated
+
+    def rotate(
+        self, instance: Model, fields: list[SecretField | SecretBinaryField]
+    ) -> bool:
+        """Rotate the secret fields of `instance`, returns True if any changed"""
+        changed = False
+        for field in fields:
+            if isinstance(field, SecretBinaryField):
+                changed |= self.rotate_binary(instance, field)
+                continue
+            value = instance.__dict__.get(field.attname)
+            ciphertext = value.ciphertext if isinstance(value, SecretBase) else None
+            # legacy values without a version are left to migrate_encrypted
+            if ciphertext and "|" in ciphertext:
+                version, _, token = ciphertext.rpartition("|")
+                rotated = get_backend(field.backend).rotate(token)
+                if rotated != token:
+                    changed = True
+                    ciphertext = f"{version}|{rotated}"
+            # write the stored ciphertext as is, without encrypting it again
+            setattr(
+                instance,
+                field.attname,
+                None
+                if ciphertext is None
+                else Value(ciphertext, output_field=TextField()),
+            )
+        return changed
+
+    def rotate_binary(self, instance: Model, field: SecretBinaryField) -> bool:
+        """Rotate a binary field of `instance`, returns True if it changed"""
+        stored = getattr(instance, STORED + field.name)
+        ciphertext = None if stored is None else bytes(stored)
+        changed = False
+        if ciphertext is not None:
+            if ciphertext[:1] != BINARY_VERSION:
+                raise DecryptionException(ValueError("Unknown binary secret version"))
+            backend = get_backend(field.backend)
+            rotated = BINARY_VERSION + backend.rotate_bytes(ciphertext[1:])
+            if rotated != ciphertext:
+                changed = True
+                ciphertext = rotated
+        # write the stored ciphertext as is, without encrypting it again
+        setattr(
+            instance,
+            field.attname,
+            None
+            if ciphertext is None
+            else Value(ciphertext, output_field=BinaryField()),
+        )
+        return changed
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from secrets_fields.warmup import (
+    DEFAULT_TIMEOUT,
+    get_secret_field,
+    get_warm_up_config,
+    local_only,
+    warm_up,
+)
+from typing import Any
+
+
+class Command(BaseCommand):
+    help = "Load secrets into the backend caches, defaults to DJANGO_SECRETS_FIELDS_WARM_UP"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--field",
+            action="append",
+            dest="fields",
+            metavar="APP_LABEL.MODEL.FIELD",
+            help="Load the stored values of this field, can be given multiple times",
+        )
+        parser.add_argument(
+            "--backend",
+            action="append",
+            dest="backends",
+            metavar="ALIAS",
+            help="Load every value of this backend, can be given multiple times",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            help=f"Seconds to wait before giving up (default {DEFAULT_TIMEOUT})",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        config = get_warm_up_config()
+        fields = options.get("fields")
+        backends = options.get("backends")
+        if not fields and not backends:
+            fields = config.get("fields")
+            backends = config.get("backends")
+        if not fields and not backends:
+            raise CommandError(
+                "Nothing to warm up, pass --field or --backend or set DJANGO_SECRETS_FIELDS_WARM_UP"
+            )
+        timeout = options.get("timeout")
+        if timeout is None:
+            timeout = config.get("timeout", DEFAULT_TIMEOUT)
+
+        result = warm_up(fields, backends, timeout)
+        for error in result.errors:
+            self.stderr.write(f"{error}")
+
+        # the cache of this process is gone when the command exits
+        aliases = list(backends or [])
+        for label in fields or []:
+            try:
+                aliases.append(get_secret_field(label).backend)
+            except ValueError:
+                # reported as an error by warm_up
+                pass
+        for alias in local_only(aliases):
+            self.stderr.write(
+                self.style.WARNING(
+                    f"{alias} has no shared_cache, only the cache of this process "
+                    "was warmed and not those of the web workers"
+                )
+            )
+        if result.timed_out:
+            raise CommandError(
+                f"Loaded {result.loaded} secrets, timed out after {timeout} seconds"
+            )
+        if result.errors:
+            raise CommandError(
+                f"Loaded {result.loaded} secrets, {len(result.errors)} failed"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Loaded {result.loaded} secrets"))
@@ -0,0 +1,143 @@
+"""
+Helpers shared by the management commands that rewrite secret fields
+"""
+
+import json
+import os
+import threading
+from django.apps import apps
+from django.core.management.base import CommandError
+from django.db.models import Max, Min, Model, Q, QuerySet
+from secrets_fields.fields import VERSION_PREFIXES, SecretBinaryField, SecretField
+from typing import Any, Iterator
+
+
+def secret_models(
+    labels: list[str] | None = None, binary: bool = False
+) -> list[tuple[type[Model], list[Any]]]:
+    """Models with at least one SecretField, with those fields
+
+    Args:
+        labels (list[str] | None): only include these models, as `app_label.ModelName`
+        binary (bool): also include SecretBinaryField fields
+    """
+    types: tuple[type, ...] = (
+        (SecretField, SecretBinaryField) if binary else (SecretField,)
+    )
+    if labels:
+        try:
+            models = [apps.get_model(label) for label in labels]
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+    else:
+        models = apps.get_models()
+
+    result = []
+    for model in models:
+        fields = [field for field in model._meta.fields if isinstance(field, types)]
+        if fields:
+            result.append((model, fields))
+        elif labels:
+            raise CommandError(f"{model._meta.label} has no secret fields")
+    return result
+
+
+def legacy_filter(fields: list[SecretField]) -> Q:
+    """
+    Rows where any of `fields` is not in the current versioned format, or has
+    a value but no blind index, such as rows saved before `blind_index=True`
+    was added
+    """
+    q = Q()
+    for field in fields:
+        current = Q()
+        for prefix in VERSION_PREFIXES:
+            current |= Q(**{f"{field.name}__startswith": prefix})
+        q |= Q(**{f"{field.name}__isnull": False}) & ~current
+        if field.blind_index:
+            q |= Q(
+                **{f"{field.name}__isnull": False, f"{field.index_name}__isnull": True}
+            )
+    return q
+
+
+def iter_batches(
+    queryset: QuerySet[Any], batch_size: int, after: Any = None
+) -> Iterator[list[Model]]:
+    """Stream `queryset` in primary key order, `batch_size` rows at a time
+
+    Each batch is a separate query starting after the last primary key of the
+    previous one, so memory use is bounded and no server side cursor is needed.
+
+    Args:
+        after (Any): start after this primary key
+    """
+    queryset = queryset.order_by("pk")
+    while True:
+        batch_qs = queryset if after is None else queryset.filter(pk__gt=after)
+        batch = list(batch_qs[:batch_size])
+        if not batch:
+            return
+        yield batch
+        after = batch[-1].pk
+
+
+def pk_ranges(queryset: QuerySet[Any], count: int) -> list[tuple[int, int]]:
+    """Split the integer primary keys of `queryset` into `count` contiguous ranges
+
+    Returns no ranges if the queryset is empty.
+    """
+    bounds = queryset.aggregate(lo=Min("pk"), hi=Max("pk"))
+    lo, hi = bounds["lo"], bounds["hi"]
+    if lo is None:
+        return []
+    step = -(-(hi - lo + 1) // count)
+    return [(start, min(start + step - 1, hi)) for start in range(lo, hi + 1, step)]
+
+
+class Checkpoint:
+    """Last primary key processed for each model, persisted to a JSON file
+
+    Without a path the checkpoint is only kept in memory. Models processed in
+    parallel have one entry per primary key range, keyed `label:start:end`.
+    """
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.positions: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.positions = json.load(f)
+
+    def get(self, key: str) -> Any:
+        return self.positions.get(key, None)
+
+    def set(self, key: str, pk: Any) -> None:
+        with self._lock:
+            self.positions[key] = pk
+            if self.path:
+                # write to a temporary file first so a kill never leaves a partial file
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(self.positions, f, default=str)
+                os.replace(tmp, self.path)
+
+    def ranges(self, label: str) -> list[tuple[int, int]]:
+        """Primary key ranges recorded for `label` by an earlier parallel run"""
+        ranges = []
+        for key in self.positions:
+            model, _, bounds = key.partition(":")
+            if model == label and bounds:
+                start, end = bounds.split(":")
+                ranges.append((int(start), int(end)))
+        return sorted(ranges)
+
+    @staticmethod
+    def range_key(label: str, start: int, end: int) -> str:
+        return f"{label}:{start}:{end}"
+
+    def clear(self) -> None:
+        self.positions = {}
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,214 @@
+"""
+QuerySet and manager for models with secret fields
+"""
+
+from collections import defaultdict
+from django.db import models
+from django.db.models.query import ModelIterable
+from typing import Any, Iterable, Sequence, TypeVar, cast
+from . import instrumentation
+from .fields import (
+    BlindIndexField,
+    SecretBase,
+    SecretField,
+    SecretJSONField,
+    deferred_decryption,
+    pre_encrypted,
+)
+from .util import get_backend
+
+_M = TypeVar("_M", bound=models.Model)
+
+
+def _secret_fields(
+    model: type[models.Model], names: Iterable[str] = ()
+) -> list[SecretField]:
+    fields = [
+        field for field in model._meta.concrete_fields if isinstance(field, SecretField)
+    ]
+    if names:
+        names = set(names)
+        fields = [field for field in fields if field.name in names]
+    return fields
+
+
+def prefetch_secrets(instances: Iterable[models.Model], *fields: str) -> None:
+    """Resolve the secret fields of `instances` with as few backend calls as possible
+
+    Secrets are grouped by backend and resolved with `BaseSecretsBackend.prefetch`,
+    fields that were loaded with `deferred_decryption` are decrypted in place.
+
+    Args:
+        instances (Iterable[models.Model]): model instances to resolve
+        fields (str): names of the secret fields to resolve, all if empty
+    """
+    instances = list(instances)
+    if not instances:
+        return
+
+    secret_fields = _secret_fields(type(instances[0]), fields)
+    secrets: dict[str, list[tuple[str, SecretBase[Any]]]] = defaultdict(list)
+    for instance in instances:
+        for field in secret_fields:
+            value = instance.__dict__.get(field.attname)
+            # unversioned values are left to SecretBase.get() to migrate
+            if isinstance(value, SecretBase) and "|" in (value.ciphertext or ""):
+                name = cast(str, value.ciphertext).split("|")[-1]
+                secrets[field.backend].append((name, value))
+
+    for alias, values in secrets.items():
+        plaintexts = instrumentation.call(
+            "prefetch",
+            alias,
+            get_backend(alias).prefetch,
+            [name for name, _ in values],
+            type(instances[0]),
+        )
+        for name, value in values:
+            plaintext = plaintexts.get(name)
+            if plaintext is not None:
+                value.prime(plaintext)
+
+    # fields that normally decrypt when loaded were returned undecrypted
+    for instance in instances:
+        for field in secret_fields:
+            value = instance.__dict__.get(field.attname)
+            if field.decrypts_on_load and isinstance(value, SecretBase):
+                value.get()
+
+
+def encrypt_secrets(
+    instances: Iterable[models.Model], *fields: str
+) -> dict[tuple[str, str], str]:
+    """Encrypt the plaintext secret fields of `instances` in bulk
+
+    Plaintexts are de-duplicated and encrypted with `BaseSecretsBackend.encrypt_many`,
+    the result is meant to be used with `pre_encrypted` so saving the instances
+    does not encrypt each value again. Unchanged JSON secrets, which are read
+    back decoded when saved, map to the ciphertext they were loaded with.
+
+    Args:
+        instances (Iterable[models.Model]): model instances about to be saved
+        fields (str): names of the secret fields to encrypt, all if empty
+
+    Returns:
+        dict[tuple[str, str], str]: ciphertext keyed by backend alias and encoded plaintext
+    """
+    instances = list(instances)
+    if not instances:
+        return {}
+
+    plaintexts: dict[str, set[str]] = defaultdict(set)
+    ciphertexts: dict[tuple[str, str], str] = {}
+    for field in _secret_fields(type(instances[0]), fields):
+        # only used to serialise the plaintext, nothing is encrypted
+        secret = field.secret_type(backend=field.backend)
+        for instance in instances:
+            value = instance.__dict__.get(field.attname)
+            if isinstance(value, SecretBase):
+                if not isinstance(field, SecretJSONField) and not value.is_dirty:
+                    # saved as is with its ciphertext, see get_prep_value
+                    continue
+                plaintext = value.get()
+                if not plaintext or value.ciphertext is None:
+                    continue
+                version, prepared = secret.encode(plaintext)
+                stored_version, _, stored = value.ciphertext.partition("|")
+                if not value.is_dirty and stored_version == version:
+                    ciphertexts[(field.backend, prepared)] = stored
+                    continue
+                value = plaintext
+            # falsy values are stored as NULL without asking the backend
+            if value:
+                plaintexts[field.backend].add(secret.encode(value)[1])
+
+    for alias, values in plaintexts.items():
+        ordered = list(values)
+        results = instrumentation.call(
+            "encrypt_many",
+            alias,
+            get_backend(alias).encrypt_many,
+            ordered,
+            type(instances[0]),
+        )
+        for plaintext, ciphertext in zip(ordered, results):
+            if isinstance(ciphertext, Exception):
+                raise ciphertext
+            ciphertexts[(alias, plaintext)] = ciphertext
+    return ciphertexts
+
+
+class SecretQuerySet(models.QuerySet[_M]):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._prefetch_secret_fields: tuple[str, ...] | None = None
+
+    def prefetch_secrets(self, *fields: str) -> "SecretQuerySet[_M]":
+        """
+        Resolve the secret fields for all rows in bulk once the query is
+        evaluated, instead of one backend call per row
+        """
+        clone: SecretQuerySet[_M] = self._chain()  # type: ignore[attr-defined]
+        clone._prefetch_secret_fields = fields
+        return clone
+
+    def _clone(self) -> "SecretQuerySet[_M]":
+        clone: SecretQuerySet[_M] = super()._clone()  # type: ignore[misc]
+        clone._prefetch_secret_fields = self._prefetch_secret_fields
+        return clone
+
+    def _fetch_all(self) -> None:
+        if (
+            self._result_cache is None
+            and self._prefetch_secret_fields is not None
+            and issubclass(self._iterable_class, ModelIterable)
+        ):
+            with deferred_decryption():
+                super()._fetch_all()
+            prefetch_secrets(
+                cast(list[_M], self._result_cache), *self._prefetch_secret_fields
+            )
+        super()._fetch_all()
+
+    def update(self, **kwargs: Any) -> int:
+        """Update the blind indexes of the secret fields being set along with them"""
+        for field in _secret_fields(self.model, kwargs):
+            if field.blind_index and field.index_name not in kwargs:
+                value = kwargs[field.name]
+                if hasattr(value, "resolve_expression"):
+                    raise ValueError(
+                        f"Cannot update {field.name} to an expression, "
+                        "its blind index cannot be computed"
+                    )
+                kwargs[field.index_name] = field.index_value(value)
+        return super().update(**kwargs)
+
+    def bulk_create(self, objs: Iterable[_M], *args: Any, **kwargs: Any) -> list[_M]:
+        """Encrypt the secret fields of all `objs` in one batch, then insert them"""
+        objs = list(objs)
+        with pre_encrypted(encrypt_secrets(objs)):
+            return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(  # type: ignore[override]
+        self, objs: Iterable[_M], fields: Sequence[str], *args: Any, **kwargs: Any
+    ) -> int:
+        """Encrypt the updated secret fields of all `objs` in one batch, then update them"""
+        objs = list(objs)
+        # bulk_update does not call pre_save, update the blind indexes here
+        fields = list(fields)
+        for field in _secret_fields(self.model, fields):
+            if field.blind_index and field.index_name not in fields:
+                index_field = cast(
+                    BlindIndexField, self.model._meta.get_field(field.index_name)
+                )
+                for obj in objs:
+                    index_field.pre_save(obj, False)
+                fields.append(field.index_name)
+        # Django rejects an empty field list, nothing needs encrypting for it
+        ciphertexts = encrypt_secrets(objs, *fields) if fields else {}
+        with pre_encrypted(ciphertexts):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+
+class SecretManager(models.Manager.from_queryset(SecretQuerySet)):  # type: ignore[misc]
+    pass
@@ -0,0 +1,60 @@
+try:
+    from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+except ImportError:
+    raise ImportError(
+        "prometheus_client is required for Prometheus metrics - pip install django-secrets-fields[prometheus]"
+    )
+from .instrumentation import Event
+
+LABELS = ["operation", "backend", "model", "field", "outcome"]
+
+
+class PrometheusObserver:
+    """Observer exporting operations as Prometheus metrics
+
+    - `secrets_fields_operations_total`: operations by outcome, the cache hit
+      ratio is the share of `cache` operations with outcome `hit`
+    - `secrets_fields_operation_duration_seconds`: histogram of durations
+    - `secrets_fields_bytes_total`: bytes of plaintext handled
+
+    Add `secrets_fields.prometheus.PrometheusObserver` to
+    `DJANGO_SECRETS_FIELDS_OBSERVERS` to register it on the default registry.
+    """
+
+    def __init__(
+        self, registry: CollectorRegistry = REGISTRY, namespace: str = "secrets_fields"
+    ):
+        self.operations = Counter(
+            "operations",
+            "Secret operations",
+            LABELS,
+            namespace=namespace,
+            registry=registry,
+        )
+        self.duration = Histogram(
+            "operation_duration_seconds",
+            "Duration of secret operations",
+            LABELS,
+            namespace=namespace,
+            registry=registry,
+        )
+        self.bytes = Counter(
+            "bytes",
+            "Bytes of plaintext encrypted, decrypted or read from a cache",
+            LABELS,
+            namespace=namespace,
+            registry=registry,
+        )
+
+    def __call__(self, event: Event) -> None:
+        labels = (
+            event.operation,
+            event.backend or "",
+            event.model or "",
+            event.field or "",
+            event.outcome,
+        )
+        self.operations.labels(*labels).inc()
+        self.duration.labels(*labels).observe(event.duration)
+        if event.size:
+            self.bytes.labels(*labels).inc(event.size)
@@ -1,8 +1,15 @@
+import threading
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.module_loading import import_string
 from .backends.backends import BaseSecretsBackend
-from typing import cast
+from typing import Any, cast
+
+
+_backends: dict[str, BaseSecretsBackend] = {}
+_backends_lock = threading.Lock()
 
 
 def get_config(key: str = "default") -> dict[str, str]:
@@ -17,10 +24,41 @@ def get_config(key: str = "default") -> dict[str, str]:
     return cast(dict[str, str], config.get(key))
 
 
-def get_backend(key: str = "default") -> BaseSecretsBackend:
+def _build_backend(key: str) -> BaseSecretsBackend:
     config = get_config(key)
     backend = config.get("backend", None)
     if backend is None:
         raise ImproperlyConfigured("DJANGO_SECRETS_FIELDS['backend'] is not set")
 
-    return cast(BaseSecretsBackend, import_string(backend)(config))
+    instance = cast(BaseSecretsBackend, import_string(backend)(config))
+    instance.alias = key
+    return instance
+
+
+def get_backend(key: str = "default") -> BaseSecretsBackend:
+    """
+    Return the backend for the alias `key`, each backend is built once per
+    process and shared between threads
+    """
+    try:
+        return _backends[key]
+    except KeyError:
+        pass
+
+    with _backends_lock:
+        # another thread may have built it while we were waiting on the lock
+        if key not in _backends:
+            _backends[key] = _build_backend(key)
+        return _backends[key]
+
+
+def reset_backends() -> None:
+    """Drop all built backends, they will be rebuilt from settings on next use"""
+    with _backends_lock:
+        _backends.clear()
+
+
+@receiver(setting_changed)
+def _setting_changed(*, setting: str, **kwargs: Any) -> None:
+    if setting == "DJANGO_SECRETS_FIELDS":
+        reset_backends()
@@ -0,0 +1,230 @@
+"""
+Loading secrets into the backend caches before the first request needs them
+
+Configured with the `DJANGO_SECRETS_FIELDS_WARM_UP` setting:
+
+- `fields`: secret fields whose stored values are loaded, as `app_label.Model.field`
+- `backends`: backend aliases whose every value is loaded with `warm`
+- `timeout`: seconds to wait for the warm-up (default 30)
+- `startup`: warm up in the background when the first request starts (default False)
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from .fields import SecretBase, SecretField, deferred_decryption
+from .util import get_backend
+from typing import Any, Callable, cast
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+
+DISPATCH_UID = "secrets_fields.warmup"
+
+# set once the startup warm-up of this process has finished, see `wait_for_warm_up`
+_finished = threading.Event()
+_result: "WarmUpResult | None" = None
+
+
+@dataclass
+class WarmUpResult:
+    loaded: int = 0
+    errors: list[str] = field(default_factory=list)
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and not self.timed_out
+
+
+def get_warm_up_config() -> dict[str, Any]:
+    return dict(getattr(settings, "DJANGO_SECRETS_FIELDS_WARM_UP", None) or {})
+
+
+def get_secret_field(label: str) -> SecretField:
+    """The secret field `app_label.Model.field`
+
+    Raises:
+        ValueError: if there is no such secret field
+    """
+    model_label, _, name = label.rpartition(".")
+    try:
+        model = apps.get_model(model_label)
+        secret_field = model._meta.get_field(name)
+    except (LookupError, ValueError) as e:
+        raise ValueError(f"{label} is not a field: {e}")
+    if not isinstance(secret_field, SecretField):
+        raise ValueError(f"{label} is not a secret field")
+    return secret_field
+
+
+def local_only(aliases: list[str]) -> list[str]:
+    """The `aliases` whose backend caches values in this process only
+
+    Warming those from a separate process, such as the `warm_secrets`
+    command, does not help the web workers.
+    """
+    result = []
+    for alias in dict.fromkeys(aliases):
+        try:
+            backend = get_backend(alias)
+        except Exception:
+            # a backend that cannot be built fails the warm-up itself
+            continue
+        if hasattr(backend, "cache") and getattr(backend, "shared", None) is None:
+            result.append(alias)
+    return result
+
+
+def warm_field(label: str) -> int:
+    """Load the stored values of a secret field into its backend's cache
+
+    Args:
+        label (str): the field as `app_label.Model.field`
+
+    Returns:
+        int: number of values loaded
+    """
+    secret_field = get_secret_field(label)
+    model = secret_field.model
+    name = secret_field.name
+
+    names = set()
+    with deferred_decryption():
+        values = model._base_manager.exclude(**{f"{name}__isnull": True})
+        for value in values.values_list(name, flat=True).iterator():
+            # unversioned values are left to SecretBase.get() to migrate
+            if isinstance(value, SecretBase) and "|" in (value.ciphertext or ""):
+                names.add(cast(str, value.ciphertext).split("|")[-1])
+    if not names:
+        return 0
+    return len(get_backend(secret_field.backend).prefetch(sorted(names)))
+
+
+def warm_backend(alias: str) -> int:
+    """Load every value of a backend into its cache, see `BaseSecretsBackend.warm`"""
+    return get_backend(alias).warm()
+
+
+def _run(func: Callable[[str], int], arg: str) -> int:
+    try:
+        return func(arg)
+    finally:
+        # each worker thread opens its own connections
+        connections.close_all()
+
+
+def warm_up(
+    fields: list[str] | None = None,
+    backends: list[str] | None = None,
+    timeout: float | None = DEFAULT_TIMEOUT,
+) -> WarmUpResult:
+    """Warm the given fields and backends concurrently
+
+    Each field and backend is loaded in its own thread, errors are collected
+    instead of raised. Work still running after `timeout` seconds is left to
+    finish in the background and reported as timed out.
+    """
+    tasks: list[tuple[str, Callable[[str], int]]] = [
+        (label, warm_field) for label in fields or []
+    ]
+    tasks += [(alias, warm_backend) for alias in backends or []]
+    result = WarmUpResult()
+    if not tasks:
+        return result
+
+    executor = ThreadPoolExecutor(
+        max_workers=len(tasks), thread_name_prefix="secrets-warm-up"
+    )
+    futures: dict[Future[int], str] = {
+        executor.submit(_run, func, name): name for name, func in tasks
+    }
+    done, pending = wait(futures, timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    for future in done:
+        try:
+            result.loaded += future.result()
+        except Exception as e:
+            result.errors.append(f"{futures[future]}: {e}")
+    result.timed_out = bool(pending)
+    return result
+
+
+def warm_up_in_background() -> threading.Thread | None:
+    """Start the configured warm-up in a daemon thread, if `startup` is enabled
+
+    The thread waits for the app registry to be ready so models can be queried,
+    the outcome is logged.
+    """
+    config = get_warm_up_config()
+    if not config or not config.get("startup", False):
+        return None
+
+    def run() -> None:
+        global _result
+        apps.ready_event.wait()
+        try:
+            result = warm_up(
+                config.get("fields"),
+                config.get("backends"),
+                config.get("timeout", DEFAULT_TIMEOUT),
+            )
+        except Exception as e:
+            logger.exception("Warming up secrets failed")
+            result = WarmUpResult(errors=[str(e)])
+        else:
+            for error in result.errors:
+                logger.warning("Warming up secrets failed: %s", error)
+            if result.timed_out:
+                logger.warning("Warming up secrets timed out")
+            logger.info("Warmed up %d secrets", result.loaded)
+        _result = result
+        _finished.set()
+
+    thread = threading.Thread(target=run, daemon=True, name="secrets-warm-up")
+    thread.start()
+    return thread
+
+
+def _warm_up_on_request(**kwargs: Any) -> None:
+    # only the request that disconnects the receiver starts the warm-up
+    if request_started.disconnect(dispatch_uid=DISPATCH_UID):
+        warm_up_in_background()
+
+
+def warm_up_on_first_request() -> None:
+    """Start the configured warm-up when the first request starts, if `startup`
+    is enabled
+
+    Management commands never warm up, and with a preforking server such as
+    gunicorn with `--preload` each worker starts its own warm-up rather than
+    the parent starting one before it forks.
+    """
+    config = get_warm_up_config()
+    if config and config.get("startup", False):
+        request_started.connect(_warm_up_on_request, dispatch_uid=DISPATCH_UID)
+
+
+def wait_for_warm_up(timeout: float | None = 0) -> WarmUpResult | None:
+    """The result of this process's startup warm-up, once it has finished
+
+    Meant for readiness checks, the first request starts the warm-up and
+    checks can then poll until it is done.
+
+    Args:
+        timeout (float | None): seconds to wait, None to wait until it finishes
+
+    Returns:
+        WarmUpResult | None: None if the warm-up has not finished in time or
+            `startup` is not enabled
+    """
+    if not _finished.wait(timeout):
+        return None
+    return _result
@@ -1,9 +1,22 @@
 # Register your models here.
 
 from django.contrib import admin
-from .models import ModelJSONAWS, ModelJSONStatic, ModelTextAWS, ModelTextStatic
+from .models import (
+    ModelBinaryStatic,
+    ModelJSONAWS,
+    ModelJSONIndexed,
+    ModelJSONLazyAWS,
+    ModelJSONStatic,
+    ModelTextAWS,
+    ModelTextIndexed,
+    ModelTextStatic,
+)
 
 admin.site.register(ModelTextStatic)
 admin.site.register(ModelJSONStatic)
 admin.site.register(ModelTextAWS)
 admin.site.register(ModelJSONAWS)
+admin.site.register(ModelJSONLazyAWS)
+admin.site.register(ModelTextIndexed)
+admin.site.register(ModelJSONIndexed)
+admin.site.register(ModelBinaryStatic)
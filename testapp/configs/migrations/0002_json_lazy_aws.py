@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:27
+
+import secrets_fields.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("configs", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ModelJSONLazyAWS",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("secret", secrets_fields.fields.SecretJSONField(null=True)),
+            ],
+        ),
+    ]
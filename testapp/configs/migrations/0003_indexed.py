@@ -0,0 +1,63 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:42
+
+import secrets_fields.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("configs", "0002_json_lazy_aws"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ModelJSONIndexed",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("secret", secrets_fields.fields.SecretJSONField(null=True)),
+                (
+                    "secret_index",
+                    secrets_fields.fields.BlindIndexField(
+                        db_index=True,
+                        editable=False,
+                        max_length=64,
+                        null=True,
+                        source="secret",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ModelTextIndexed",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("secret", secrets_fields.fields.SecretTextField(null=True)),
+                (
+                    "secret_index",
+                    secrets_fields.fields.BlindIndexField(
+                        db_index=True,
+                        editable=False,
+                        max_length=64,
+                        null=True,
+                        source="secret",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
-from secrets_fields.fields import SecretTextField, SecretJSONField
+from secrets_fields.fields import SecretBinaryField, SecretTextField, SecretJSONField
+from secrets_fields.managers import SecretManager
 
 # Create your models here.
 
@@ -7,14 +8,46 @@ from secrets_fields.fields import SecretTextField, SecretJSONField
 class ModelTextStatic(models.Model):
     secret = SecretTextField(null=True, backend="static")
 
+    objects = SecretManager()
+
 
 class ModelJSONStatic(models.Model):
     secret = SecretJSONField(null=True, backend="static")
 
+    objects = SecretManager()
+
 
 class ModelTextAWS(models.Model):
     secret = SecretTextField(null=True, backend="aws")
 
+    objects = SecretManager()
+
 
 class ModelJSONAWS(models.Model):
     secret = SecretJSONField(null=True, backend="aws")
+
+    objects = SecretManager()
+
+
+class ModelJSONLazyAWS(models.Model):
+    secret = SecretJSONField(null=True, backend="aws", lazy=True)
+
+    objects = SecretManager()
+
+
+class ModelTextIndexed(models.Model):
+    secret = SecretTextField(null=True, backend="static", blind_index=True)
+
+    objects = SecretManager()
+
+
+class ModelJSONIndexed(models.Model):
+    secret = SecretJSONField(null=True, backend="static", blind_index=True)
+
+    objects = SecretManager()
+
+
+class ModelBinaryStatic(models.Model):
+    secret = SecretBinaryField(null=True, backend="static")
+
+    objects = SecretManager()
@@ -0,0 +1,16 @@
+import pytest
+from django.core.cache import caches
+from secrets_fields.backends.aws import clear_clients
+from secrets_fields.util import reset_backends
+
+
+@pytest.fixture(autouse=True)
+def _reset_backends():
+    # backends and clients are cached per process, make sure no state leaks
+    # between tests
+    reset_backends()
+    clear_clients()
+    yield
+    reset_backends()
+    clear_clients()
+    caches["default"].clear()
@@ -80,6 +80,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        # a file rather than in memory database so tests can write from threads
+        "TEST": {"NAME": os.path.join(BASE_DIR, "test_db.sqlite3")},
     }
 }
 
@@ -129,6 +131,7 @@ DJANGO_SECRETS_FIELDS = {
     "static": {
         "backend": "secrets_fields.backends.encrypted.EncryptedBackend",
         "encryption_key": b"5_SgmNvlc9aNe1qePC2VdkJHE9fEUYN4xLVUoVZ6IbM=",
+        "blind_index_key": "GXdYyQFbnjVBuXk8bOJaj6DTNObqMWt2",
     },
     "aws": {
         "backend": "secrets_fields.backends.secretsmanager.SecretsManagerBackend",
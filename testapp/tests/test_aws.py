@@ -0,0 +1,67 @@
+import boto3
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from moto import mock_aws
+from secrets_fields.backends import aws
+from secrets_fields.backends.secretsmanager import SecretsManagerBackend
+
+ROLE_ARN = "arn:aws:iam::123456789012:role/role_name"
+
+
+@mock_aws
+def test_get_client_reused() -> None:
+    client = aws.get_client("secretsmanager")
+    assert aws.get_client("secretsmanager") is client
+    assert aws.get_client("secretsmanager", role_arn=ROLE_ARN) is not client
+
+
+@mock_aws
+def test_assume_role_once() -> None:
+    backend = SecretsManagerBackend(
+        {"prefix": "/path/", "role_arn_ro": ROLE_ARN, "role_arn_rw": ROLE_ARN}
+    )
+    with patch(
+        "secrets_fields.backends.aws.boto3.client", wraps=boto3.client
+    ) as mock_client:
+        name = backend.encrypt("plaintext")
+        backend.invalidate()
+        assert backend.decrypt(name) == "plaintext"
+        assert backend.client_ro is backend.client_rw
+        sts_calls = [c for c in mock_client.call_args_list if c.args == ("sts",)]
+        assert len(sts_calls) == 1
+
+
+@mock_aws
+def test_assume_role_refresh_before_expiry() -> None:
+    aws.get_client("secretsmanager", role_arn=ROLE_ARN)
+    session = aws._sessions[ROLE_ARN]
+    credentials = session.credentials
+    access_key = credentials.get_frozen_credentials().access_key
+
+    # credentials inside the refresh window are refreshed by the background timer
+    credentials._expiry_time = datetime.now(timezone.utc) + timedelta(
+        seconds=aws.REFRESH_BEFORE_EXPIRY
+    )
+    session._background_refresh()
+    assert credentials.get_frozen_credentials().access_key != access_key
+    assert credentials._expiry_time > datetime.now(timezone.utc) + timedelta(
+        seconds=aws.REFRESH_BEFORE_EXPIRY
+    )
+
+
+@mock_aws
+def test_schedule_refresh() -> None:
+    aws.get_client("secretsmanager", role_arn=ROLE_ARN)
+    session = aws._sessions[ROLE_ARN]
+    assert session._timer is not None
+    assert session._timer.daemon
+
+    aws.clear_clients()
+    assert session._timer is None
+
+
+@mock_aws
+def test_reset_after_fork() -> None:
+    client = aws.get_client("secretsmanager")
+    aws._reset_after_fork()
+    assert aws.get_client("secretsmanager") is not client
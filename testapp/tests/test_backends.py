@@ -1,7 +1,21 @@
+import base64
+import boto3
 import pytest
+import threading
+import time
+from cryptography import fernet
+from secrets_fields.backends.aead import AEADBackend
 from secrets_fields.backends.backends import BaseSecretsBackend
 from secrets_fields.backends.encrypted import EncryptedBackend
+from secrets_fields.backends.envelope import EnvelopeBackend, LocalKeyProvider
+from secrets_fields.backends.parameterstore import ParameterStoreBackend
+from secrets_fields.backends.secretsmanager import SecretsManagerBackend
+from botocore.exceptions import ClientError
+from moto import mock_aws
+from unittest.mock import patch
 from django.core.exceptions import ImproperlyConfigured
+from secrets_fields.exceptions import CircuitOpenException, DecryptionException
+from secrets_fields.fields import SecretText
 
 
 def test_encrypt_raises_not_implemented_error() -> None:
@@ -20,3 +34,670 @@ def test_encrypted_no_key() -> None:
     backend = EncryptedBackend({})
     with pytest.raises(ImproperlyConfigured):
         backend.encrypt("plaintext")
+
+
+KEY = b"5_SgmNvlc9aNe1qePC2VdkJHE9fEUYN4xLVUoVZ6IbM="
+OLD_KEY = b"M2jpxoWkyHXU51ZR0MIEDH0CUkAcivC_TJ-6dpTD29s="
+
+
+def test_encrypted_crypter_reused() -> None:
+    backend = EncryptedBackend({"encryption_key": KEY})
+    crypter = backend._crypter
+    with patch.object(fernet, "Fernet", wraps=fernet.Fernet) as fernet_class:
+        for _ in range(10):
+            assert backend.decrypt(backend.encrypt("plaintext")) == "plaintext"
+    # the crypter is built once, not for each value
+    fernet_class.assert_not_called()
+    assert backend._crypter is crypter
+
+
+def test_encrypted_multiple_keys() -> None:
+    old_ciphertext = fernet.Fernet(OLD_KEY).encrypt(b"plaintext").decode("utf-8")
+    backend = EncryptedBackend({"encryption_key": [KEY, OLD_KEY]})
+    assert isinstance(backend._crypter, fernet.MultiFernet)
+    assert backend.decrypt(old_ciphertext) == "plaintext"
+
+    # new values are encrypted with the first key
+    ciphertext = backend.encrypt("plaintext")
+    assert fernet.Fernet(KEY).decrypt(ciphertext.encode("utf-8")) == b"plaintext"
+
+
+@mock_aws
+def test_secretsmanager_decrypt_cached() -> None:
+    backend = SecretsManagerBackend({"prefix": "/path/"})
+    name = backend.encrypt("plaintext")
+    backend.invalidate()
+
+    client = boto3.client("secretsmanager")
+    with patch(
+        "secrets_fields.backends.secretsmanager.get_client", return_value=client
+    ):
+        with patch.object(
+            client, "get_secret_value", wraps=client.get_secret_value
+        ) as mock:
+            assert backend.decrypt(name) == "plaintext"
+            assert backend.decrypt(name) == "plaintext"
+            assert mock.call_count == 1
+
+            backend.invalidate(name)
+            assert backend.decrypt(name) == "plaintext"
+            assert mock.call_count == 2
+
+    stats = backend.cache.stats()
+    assert stats.hits == 1
+    assert stats.misses == 2
+
+
+@mock_aws
+def test_secretsmanager_decrypt_cache_disabled() -> None:
+    backend = SecretsManagerBackend({"prefix": "/path/", "cache_ttl": 0})
+    name = backend.encrypt("plaintext")
+    assert backend.decrypt(name) == "plaintext"
+    assert len(backend.cache) == 0
+
+
+def test_encrypted_rotate() -> None:
+    old_ciphertext = fernet.Fernet(OLD_KEY).encrypt(b"plaintext").decode("utf-8")
+    backend = EncryptedBackend({"encryption_key": [KEY, OLD_KEY]})
+
+    rotated = backend.rotate(old_ciphertext)
+    assert fernet.Fernet(KEY).decrypt(rotated.encode("utf-8")) == b"plaintext"
+    # already encrypted with the first key
+    assert backend.rotate(rotated) == rotated
+
+    with pytest.raises(DecryptionException):
+        EncryptedBackend({"encryption_key": KEY}).rotate(old_ciphertext)
+    with pytest.raises(DecryptionException):
+        backend.rotate("invalid")
+
+    old_token = fernet.Fernet(OLD_KEY).encrypt(b"\xff\x00")
+    fernet_raw = base64.urlsafe_b64decode(old_token)
+    rotated_raw = backend.rotate_bytes(fernet_raw)
+    assert EncryptedBackend({"encryption_key": KEY}).decrypt_bytes(rotated_raw) == (
+        b"\xff\x00"
+    )
+    assert backend.rotate_bytes(rotated_raw) == rotated_raw
+
+
+class UpperBackend(BaseSecretsBackend):
+    def encrypt(self, plaintext: str) -> str:
+        if not plaintext:
+            raise ValueError("empty")
+        return plaintext.upper()
+
+    def decrypt(self, ciphertext: str) -> str:
+        if not ciphertext.isupper():
+            raise DecryptionException(ValueError(ciphertext))
+        return ciphertext.lower()
+
+
+def test_many_default() -> None:
+    backend = UpperBackend({})
+    results = backend.encrypt_many(["a", "", "b"])
+    assert results[0] == "A"
+    assert isinstance(results[1], ValueError)
+    assert results[2] == "B"
+
+    results = backend.decrypt_many(["A", "b"])
+    assert results[0] == "a"
+    assert isinstance(results[1], DecryptionException)
+
+
+def test_encrypted_many() -> None:
+    backend = EncryptedBackend({"encryption_key": KEY})
+    results = backend.encrypt_many(["a", None, "b"])
+    assert isinstance(results[1], AttributeError)
+    ciphertexts = [results[0], results[2]]
+    results = backend.decrypt_many([*ciphertexts, "invalid"])
+    assert results[:2] == ["a", "b"]
+    assert isinstance(results[2], DecryptionException)
+
+
+@mock_aws
+def test_secretsmanager_many() -> None:
+    backend = SecretsManagerBackend({"prefix": "/path/"})
+    client = boto3.client("secretsmanager")
+    with patch(
+        "secrets_fields.backends.secretsmanager.get_client", return_value=client
+    ):
+        with patch.object(
+            client, "create_secret", wraps=client.create_secret
+        ) as mock_create:
+            names = backend.encrypt_many([f"secret-{i}" for i in range(25)] * 2)
+            assert mock_create.call_count == 25
+        assert names[:25] == names[25:]
+        backend.invalidate()
+
+        with patch.object(
+            client, "batch_get_secret_value", wraps=client.batch_get_secret_value
+        ) as mock_batch:
+            results = backend.decrypt_many([*names[:25], "/path/missing"])
+            assert mock_batch.call_count == 2
+        assert results[:25] == [f"secret-{i}" for i in range(25)]
+        assert isinstance(results[25], DecryptionException)
+
+        # values are cached
+        with patch.object(client, "batch_get_secret_value") as mock_batch:
+            assert backend.decrypt_many(names[:2]) == ["secret-0", "secret-1"]
+            assert mock_batch.call_count == 0
+
+
+@mock_aws
+def test_secretsmanager_many_errors() -> None:
+    backend = SecretsManagerBackend({"prefix": "/path/"})
+    client = boto3.client("secretsmanager")
+    error = ClientError(
+        {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+        "BatchGetSecretValue",
+    )
+    with patch(
+        "secrets_fields.backends.secretsmanager.get_client", return_value=client
+    ):
+        with patch.object(client, "batch_get_secret_value", side_effect=error):
+            results = backend.decrypt_many(["/path/a", "/path/b"])
+        assert results == [error, error]
+        assert backend.prefetch(["/path/a"]) == {}
+
+
+@mock_aws
+def test_secretsmanager_encrypt_existing() -> None:
+    client = boto3.client("secretsmanager")
+    with patch(
+        "secrets_fields.backends.secretsmanager.get_client", return_value=client
+    ):
+        name = SecretsManagerBackend({"prefix": "/path/"}).encrypt("plaintext")
+
+        backend = SecretsManagerBackend({"prefix": "/path/"})
+        with (
+            patch.object(
+                client, "create_secret", wraps=client.create_secret
+            ) as mock_create,
+            patch.object(
+                client, "get_secret_value", wraps=client.get_secret_value
+            ) as mock_get,
+        ):
+            # already created by another process
+            assert backend.encrypt("plaintext") == name
+            assert mock_create.call_count == 1
+            # known to exist now
+            assert backend.encrypt("plaintext") == name
+            assert mock_create.call_count == 1
+            assert mock_get.call_count == 0
+        assert backend.decrypt(name) == "plaintext"
+
+
+AEAD_KEY = "8kZ0mIJVYGhV8Ob1tmRSzOuTC3zXUqHq7Qt7xUQeqPA="
+OLD_AEAD_KEY = "0h6vH3oTuXy1nQn6G1vHUzJkC0k5r1Z2b0vjjxu3n3E="
+
+
+@pytest.mark.parametrize("algorithm", ["aes-gcm", "chacha20-poly1305"])
+def test_aead(algorithm: str) -> None:
+    backend = AEADBackend({"encryption_key": AEAD_KEY, "algorithm": algorithm})
+    ciphertext = backend.encrypt("plaintext")
+    assert backend.decrypt(ciphertext) == "plaintext"
+    assert backend.encrypt("plaintext") != ciphertext
+    assert backend.rotate(ciphertext) == ciphertext
+
+    # either algorithm can be read with the same key
+    other = AEADBackend({"encryption_key": AEAD_KEY})
+    assert other.decrypt(ciphertext) == "plaintext"
+
+    assert backend.decrypt_many([ciphertext, ciphertext[:-2]])[0] == "plaintext"
+    with pytest.raises(DecryptionException):
+        backend.decrypt(ciphertext[:-2])
+
+    # a valid header with the token cut off inside the nonce
+    token = backend.encrypt_bytes(b"plaintext")
+    with pytest.raises(DecryptionException):
+        backend.decrypt_bytes(token[:8])
+    truncated = base64.urlsafe_b64encode(token[:8]).decode("ascii")
+    results = backend.decrypt_many([ciphertext, truncated])
+    assert results[0] == "plaintext"
+    assert isinstance(results[1], DecryptionException)
+
+
+def test_aead_config() -> None:
+    with pytest.raises(ImproperlyConfigured):
+        AEADBackend({}).encrypt("plaintext")
+    with pytest.raises(ImproperlyConfigured):
+        AEADBackend({"encryption_key": KEY[:20]}).encrypt("plaintext")
+    with pytest.raises(ImproperlyConfigured):
+        AEADBackend({"encryption_key": AEAD_KEY, "algorithm": "des"}).encrypt("a")
+
+
+def test_aead_multiple_keys() -> None:
+    old_ciphertext = AEADBackend({"encryption_key": OLD_AEAD_KEY}).encrypt("plaintext")
+    backend = AEADBackend({"encryption_key": [AEAD_KEY, OLD_AEAD_KEY]})
+    assert backend.decrypt(old_ciphertext) == "plaintext"
+    with pytest.raises(DecryptionException):
+        AEADBackend({"encryption_key": AEAD_KEY}).decrypt(old_ciphertext)
+
+    rotated = backend.rotate(old_ciphertext)
+    assert rotated != old_ciphertext
+    assert AEADBackend({"encryption_key": AEAD_KEY}).decrypt(rotated) == "plaintext"
+
+    old_raw = AEADBackend({"encryption_key": OLD_AEAD_KEY}).encrypt_bytes(b"\xff")
+    rotated_raw = backend.rotate_bytes(old_raw)
+    assert AEADBackend({"encryption_key": AEAD_KEY}).decrypt_bytes(rotated_raw) == (
+        b"\xff"
+    )
+    assert backend.rotate_bytes(rotated_raw) == rotated_raw
+
+
+def test_aead_fernet_fallback() -> None:
+    fernet_ciphertext = EncryptedBackend({"encryption_key": KEY}).encrypt("plaintext")
+    with pytest.raises(DecryptionException):
+        AEADBackend({"encryption_key": AEAD_KEY}).decrypt(fernet_ciphertext)
+
+    backend = AEADBackend({"encryption_key": AEAD_KEY, "fernet_key": KEY})
+    assert backend.decrypt(fernet_ciphertext) == "plaintext"
+    rotated = backend.rotate(fernet_ciphertext)
+    assert not rotated.startswith("gAAAAA")
+    assert backend.decrypt(rotated) == "plaintext"
+
+
+def test_aead_side_by_side(settings) -> None:
+    stored = SecretText(plaintext="plaintext", backend="static").ciphertext
+    settings.DJANGO_SECRETS_FIELDS = {
+        "static": {
+            "backend": "secrets_fields.backends.aead.AEADBackend",
+            "encryption_key": AEAD_KEY,
+            "fernet_key": KEY,
+        }
+    }
+    assert SecretText(ciphertext=stored, backend="static").get() == "plaintext"
+    new = SecretText(plaintext="plaintext", backend="static").ciphertext
+    assert new.startswith("v1|")
+    assert SecretText(ciphertext=new, backend="static").get() == "plaintext"
+
+
+def test_aead_stored_size() -> None:
+    """Stored size of Fernet vs AES-GCM and ChaCha20-Poly1305"""
+    fernet_backend = EncryptedBackend({"encryption_key": KEY})
+    assert len(fernet_backend.encrypt("x" * 16)) == 120
+    for algorithm in ("aes-gcm", "chacha20-poly1305"):
+        backend = AEADBackend({"encryption_key": AEAD_KEY, "algorithm": algorithm})
+        assert len(backend.encrypt("x" * 16)) == 66
+        assert len(backend.encrypt("x" * 4096)) < len(
+            fernet_backend.encrypt("x" * 4096)
+        )
+
+
+def test_bytes() -> None:
+    with pytest.raises(NotImplementedError):
+        BaseSecretsBackend({}).encrypt_bytes(b"plaintext")
+    with pytest.raises(NotImplementedError):
+        BaseSecretsBackend({}).decrypt_bytes(b"ciphertext")
+
+    fernet_backend = EncryptedBackend({"encryption_key": KEY})
+    aead_backend = AEADBackend({"encryption_key": AEAD_KEY, "fernet_key": KEY})
+    for backend in (fernet_backend, aead_backend):
+        ciphertext = backend.encrypt_bytes(b"\x00\xff")
+        assert backend.decrypt_bytes(ciphertext) == b"\x00\xff"
+        # no base64 encoding
+        assert len(ciphertext) < len(backend.encrypt("\x00\xff"))
+        with pytest.raises(DecryptionException):
+            backend.decrypt_bytes(ciphertext[:-1])
+
+    assert aead_backend.decrypt_bytes(fernet_backend.encrypt_bytes(b"a")) == b"a"
+
+
+MASTER_KEY = "n4uWkLYr4oeaVGJQmv2fTjQ9n0Qx8mR1lBs2xw3pW5c="
+
+
+@pytest.fixture
+def key_file(tmp_path):
+    path = tmp_path / "master.key"
+    path.write_text(f"{MASTER_KEY}\n")
+    return path
+
+
+def envelope_backend(key_file, **config) -> EnvelopeBackend:
+    return EnvelopeBackend(
+        {
+            "key_provider": "secrets_fields.backends.envelope.LocalKeyProvider",
+            "key_file": str(key_file),
+            **config,
+        }
+    )
+
+
+def test_envelope(key_file) -> None:
+    backend = envelope_backend(key_file)
+    with patch.object(
+        LocalKeyProvider,
+        "generate_data_key",
+        wraps=backend.key_provider.generate_data_key,
+    ) as mock_generate:
+        ciphertexts = [backend.encrypt(f"plaintext-{i}") for i in range(10)]
+        # one data key for all values
+        assert mock_generate.call_count == 1
+    assert backend.decrypt_bytes(backend.encrypt_bytes(b"\x00")) == b"\x00"
+
+    other = envelope_backend(key_file)
+    with patch.object(
+        LocalKeyProvider, "decrypt_data_key", wraps=other.key_provider.decrypt_data_key
+    ) as mock_decrypt:
+        assert [other.decrypt(c) for c in ciphertexts] == [
+            f"plaintext-{i}" for i in range(10)
+        ]
+        # unwrapped once and then cached
+        assert mock_decrypt.call_count == 1
+
+    with pytest.raises(DecryptionException):
+        backend.decrypt(ciphertexts[0][:-4])
+    with pytest.raises(DecryptionException):
+        backend.decrypt("invalid")
+
+    token = backend.encrypt_bytes(b"plaintext")
+    size = int.from_bytes(token[1:3], "big")
+    for truncated in (
+        # cut off inside the nonce
+        token[: 3 + size + 4],
+        # no wrapped data key
+        token[:1] + bytes(2) + token[3:],
+        # a wrapped data key too short to unwrap
+        token[:1] + (8).to_bytes(2, "big") + token[3:],
+    ):
+        with pytest.raises(DecryptionException):
+            envelope_backend(key_file).decrypt_bytes(truncated)
+
+
+def test_envelope_data_key_max_age(key_file) -> None:
+    backend = envelope_backend(key_file, data_key_max_age=0)
+    with patch.object(
+        LocalKeyProvider,
+        "generate_data_key",
+        wraps=backend.key_provider.generate_data_key,
+    ) as mock_generate:
+        backend.encrypt("a")
+        backend.encrypt("b")
+        assert mock_generate.call_count == 2
+
+
+def test_envelope_config(key_file, tmp_path) -> None:
+    with pytest.raises(ImproperlyConfigured):
+        EnvelopeBackend({}).encrypt("plaintext")
+    with pytest.raises(ImproperlyConfigured):
+        EnvelopeBackend(
+            {"key_provider": "secrets_fields.backends.envelope.LocalKeyProvider"}
+        ).encrypt("plaintext")
+    empty = tmp_path / "empty.key"
+    empty.write_text("")
+    with pytest.raises(ImproperlyConfigured):
+        envelope_backend(empty).encrypt("plaintext")
+
+
+def test_envelope_rotate(key_file, tmp_path) -> None:
+    ciphertext = envelope_backend(key_file).encrypt("plaintext")
+
+    new_key_file = tmp_path / "new.key"
+    new_key_file.write_text(f"{AEAD_KEY}\n{MASTER_KEY}\n")
+    backend = envelope_backend(new_key_file)
+    assert backend.decrypt(ciphertext) == "plaintext"
+    rotated = backend.rotate(ciphertext)
+    assert rotated != ciphertext
+    assert backend.rotate(rotated) == rotated
+
+    raw = envelope_backend(key_file).encrypt_bytes(b"\xff")
+    rotated_raw = backend.rotate_bytes(raw)
+    assert rotated_raw != raw
+    assert backend.decrypt_bytes(rotated_raw) == b"\xff"
+    assert backend.rotate_bytes(rotated_raw) == rotated_raw
+
+    with pytest.raises(DecryptionException):
+        envelope_backend(key_file).decrypt(rotated)
+
+
+@mock_aws
+def test_envelope_kms() -> None:
+    key_id = boto3.client("kms").create_key()["KeyMetadata"]["KeyId"]
+    backend = EnvelopeBackend(
+        {
+            "key_provider": "secrets_fields.backends.kms.KMSKeyProvider",
+            "kms_key_id": key_id,
+        }
+    )
+    ciphertext = backend.encrypt("plaintext")
+    backend.invalidate()
+    assert backend.decrypt(ciphertext) == "plaintext"
+
+
+@pytest.fixture
+def ssm():
+    with mock_aws():
+        client = boto3.client("ssm")
+        with patch(
+            "secrets_fields.backends.parameterstore.get_client", return_value=client
+        ):
+            yield client
+
+
+def test_parameterstore(ssm) -> None:
+    backend = ParameterStoreBackend({"prefix": "/path/"})
+    name = backend.encrypt("plaintext")
+    assert name.startswith("/path/")
+    parameter = ssm.get_parameter(Name=name)["Parameter"]
+    assert parameter["Type"] == "SecureString"
+
+    # already exists
+    assert ParameterStoreBackend({"prefix": "/path/"}).encrypt("plaintext") == name
+
+    backend.invalidate()
+    with patch.object(ssm, "get_parameter", wraps=ssm.get_parameter) as mock_get:
+        assert backend.decrypt(name) == "plaintext"
+        assert backend.decrypt(name) == "plaintext"
+        assert mock_get.call_count == 1
+    with pytest.raises(DecryptionException):
+        backend.decrypt("/path/missing")
+
+
+def test_parameterstore_many(ssm) -> None:
+    backend = ParameterStoreBackend({"prefix": "/path/"})
+    names = backend.encrypt_many([f"secret-{i}" for i in range(25)])
+    backend.invalidate()
+
+    with patch.object(
+        ssm, "get_parameters", wraps=ssm.get_parameters
+    ) as mock_get_parameters:
+        results = backend.decrypt_many([*names, "/path/missing"])
+        # 26 names in chunks of 10
+        assert mock_get_parameters.call_count == 3
+    assert results[:25] == [f"secret-{i}" for i in range(25)]
+    assert isinstance(results[25], DecryptionException)
+
+
+def test_parameterstore_load_path(ssm) -> None:
+    backend = ParameterStoreBackend({"prefix": "/path/"})
+    names = backend.encrypt_many([f"secret-{i}" for i in range(25)])
+    ssm.put_parameter(Name="/other/value", Value="other", Type="SecureString")
+    backend.invalidate()
+
+    assert backend.load_path() == 25
+    with (
+        patch.object(ssm, "get_parameter") as mock_get,
+        patch.object(ssm, "get_parameters") as mock_get_parameters,
+    ):
+        assert backend.decrypt_many(names) == [f"secret-{i}" for i in range(25)]
+        assert mock_get.call_count == 0
+        assert mock_get_parameters.call_count == 0
+
+
+@mock_aws
+def test_secretsmanager_shared_cache() -> None:
+    config = {
+        "prefix": "/path/",
+        "shared_cache": "default",
+        "shared_cache_key": KEY,
+    }
+    client = boto3.client("secretsmanager")
+    with patch(
+        "secrets_fields.backends.secretsmanager.get_client", return_value=client
+    ):
+        names = SecretsManagerBackend(config).encrypt_many(["a", "b", "c"])
+
+        # a cold process is served from the shared cache
+        worker = SecretsManagerBackend(config)
+        with (
+            patch.object(client, "get_secret_value") as mock_get,
+            patch.object(client, "batch_get_secret_value") as mock_batch,
+        ):
+            assert worker.decrypt(names[0]) == "a"
+            assert worker.decrypt_many(names[1:]) == ["b", "c"]
+            assert mock_get.call_count == 0
+            assert mock_batch.call_count == 0
+        assert len(worker.cache) == 3
+
+        worker.invalidate(names[0])
+        with patch.object(
+            client, "get_secret_value", wraps=client.get_secret_value
+        ) as mock_get:
+            assert SecretsManagerBackend(config).decrypt(names[0]) == "a"
+            assert mock_get.call_count == 1
+
+    with pytest.raises(ImproperlyConfigured):
+        SecretsManagerBackend({"prefix": "/path/", "shared_cache": "default"})
+
+
+THROTTLED = ClientError(
+    {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+    "GetSecretValue",
+)
+
+
+@mock_aws
+def test_secretsmanager_stale_while_revalidate() -> None:
+    backend = SecretsManagerBackend({"prefix": "/path/", "stale_ttl": 300})
+    client = boto3.client("secretsmanager")
+    with patch(
+        "secrets_fields.backends.secretsmanager.get_client", return_value=client
+    ):
+        with patch("secrets_fields.cache.time.monotonic", return_value=100):
+            name = backend.encrypt("plaintext")
+        client.put_secret_value(SecretId=name, SecretString="rotated")
+
+        refreshed = threading.Event()
+        get_secret_value = client.get_secret_value
+
+        def get_and_signal(**kwargs):
+            try:
+                return get_secret_value(**kwargs)
+            finally:
+                refreshed.set()
+
+        with (
+            patch("secrets_fields.cache.time.monotonic", return_value=200),
+            patch.object(client, "get_secret_value", side_effect=get_and_signal),
+        ):
+            # expired, the old value is returned and refreshed in the background
+            assert backend.decrypt(name) == "plaintext"
+            assert refreshed.wait(5)
+            for _ in range(100):
+                if not backend._refreshing:
+                    break
+                time.sleep(0.01)
+            assert backend.decrypt(name) == "rotated"
+
+
+@mock_aws
+def test_secretsmanager_stale_refresh_batched() -> None:
+    backend = SecretsManagerBackend({"prefix": "/path/", "stale_ttl": 300})
+    client = boto3.client("secretsmanager")
+    with patch(
+        "secrets_fields.backends.secretsmanager.get_client", return_value=client
+    ):
+        with patch("secrets_fields.cache.time.monotonic", return_value=100):
+            names = [backend.encrypt(f"secret-{i}") for i in range(3)]
+        for name in names:
+            client.put_secret_value(SecretId=name, SecretString=f"rotated-{name}")
+
+        release = threading.Event()
+        batch_get = client.batch_get_secret_value
+
+        def blocked_batch_get(**kwargs):
+            release.wait(5)
+            return batch_get(**kwargs)
+
+        with (
+            patch("secrets_fields.cache.time.monotonic", return_value=200),
+            patch.object(
+                client, "batch_get_secret_value", side_effect=blocked_batch_get
+            ) as mock_batch,
+            patch.object(client, "get_secret_value") as mock_get,
+        ):
+            # stale values are returned, and refreshed once however often read
+            for _ in range(3):
+                assert backend.decrypt_many(names) == [f"secret-{i}" for i in range(3)]
+                assert backend.decrypt(names[0]) == "secret-0"
+            assert backend._refreshing == set(names)
+            release.set()
+            # the refresh thread runs one task at a time, this waits for it
+            backend._refresher.submit(lambda: None).result(5)
+
+            assert mock_batch.call_count == 1
+            assert mock_get.call_count == 0
+            assert not backend._refreshing
+            assert backend.decrypt_many(names) == [f"rotated-{name}" for name in names]
+
+
+@mock_aws
+def test_secretsmanager_negative_cache() -> None:
+    backend = SecretsManagerBackend({"prefix": "/path/", "negative_cache_ttl": 10})
+    client = boto3.client("secretsmanager")
+    with patch(
+        "secrets_fields.backends.secretsmanager.get_client", return_value=client
+    ):
+        with patch.object(
+            client, "get_secret_value", wraps=client.get_secret_value
+        ) as mock_get:
+            for _ in range(3):
+                with pytest.raises(DecryptionException):
+                    backend.decrypt("/path/missing")
+            assert mock_get.call_count == 1
+
+        with patch.object(client, "batch_get_secret_value") as mock_batch:
+            results = backend.decrypt_many(["/path/missing"])
+            assert isinstance(results[0], DecryptionException)
+            assert mock_batch.call_count == 0
+
+        # creating the secret clears the negative entry
+        name = backend.encrypt("plaintext")
+        backend.invalidate(name)
+        assert backend.decrypt(name) == "plaintext"
+
+
+@mock_aws
+def test_secretsmanager_circuit_breaker() -> None:
+    backend = SecretsManagerBackend(
+        {
+            "prefix": "/path/",
+            "circuit_breaker_threshold": 2,
+            "circuit_breaker_reset": 30,
+        }
+    )
+    client = boto3.client("secretsmanager")
+    with patch(
+        "secrets_fields.backends.secretsmanager.get_client", return_value=client
+    ):
+        name = backend.encrypt("plaintext")
+        backend.invalidate()
+
+        with patch("secrets_fields.circuit.time.monotonic", return_value=100):
+            with patch.object(
+                client, "get_secret_value", side_effect=THROTTLED
+            ) as mock_get:
+                for _ in range(2):
+                    with pytest.raises(ClientError):
+                        backend.decrypt(name)
+                # fails fast without calling AWS
+                with pytest.raises(CircuitOpenException):
+                    backend.decrypt(name)
+                assert mock_get.call_count == 2
+            with patch.object(client, "batch_get_secret_value") as mock_batch:
+                results = backend.decrypt_many([name])
+                assert isinstance(results[0], CircuitOpenException)
+                assert mock_batch.call_count == 0
+
+        with patch("secrets_fields.circuit.time.monotonic", return_value=130):
+            assert backend.decrypt(name) == "plaintext"
+            assert not backend.breaker.is_open
@@ -0,0 +1,104 @@
+import pytest
+from cryptography import fernet
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from unittest.mock import patch
+from secrets_fields.cache import SharedCache, TTLCache
+
+
+def test_cache_get_set() -> None:
+    cache: TTLCache[str] = TTLCache(ttl=30, maxsize=10)
+    assert cache.get("a") is None
+    cache.set("a", "1")
+    assert cache.get("a") == "1"
+
+    stats = cache.stats()
+    assert stats.hits == 1
+    assert stats.misses == 1
+    assert stats.size == 1
+
+
+def test_cache_ttl() -> None:
+    cache: TTLCache[str] = TTLCache(ttl=30, maxsize=10)
+    with patch("secrets_fields.cache.time.monotonic", return_value=100):
+        cache.set("a", "1")
+    with patch("secrets_fields.cache.time.monotonic", return_value=129):
+        assert cache.get("a") == "1"
+    with patch("secrets_fields.cache.time.monotonic", return_value=131):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cache_lru_eviction() -> None:
+    cache: TTLCache[str] = TTLCache(ttl=None, maxsize=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    # touch a so b is the least recently used
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_cache_invalidate() -> None:
+    cache: TTLCache[str] = TTLCache()
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.get("b") == "2"
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_cache_disabled() -> None:
+    cache: TTLCache[str] = TTLCache(ttl=0)
+    cache.set("a", "1")
+    assert cache.get("a") is None
+
+
+SHARED_KEY = b"5_SgmNvlc9aNe1qePC2VdkJHE9fEUYN4xLVUoVZ6IbM="
+OTHER_KEY = b"M2jpxoWkyHXU51ZR0MIEDH0CUkAcivC_TJ-6dpTD29s="
+
+
+def test_shared_cache() -> None:
+    shared = SharedCache("default", key=SHARED_KEY, ttl=30)
+    shared.set_many({"/path/a": "1", "/path/b": "2"})
+    assert shared.get("/path/a") == "1"
+    assert shared.get_many(["/path/a", "/path/b", "/path/c"]) == {
+        "/path/a": "1",
+        "/path/b": "2",
+    }
+
+    # encrypted at rest
+    stored = caches["default"].get(SharedCache._key("/path/a"))
+    assert b"1" != stored
+    assert fernet.Fernet(SHARED_KEY).decrypt(stored) == b"1"
+
+    shared.delete("/path/a")
+    assert shared.get("/path/a") is None
+
+    # entries written with another key are ignored
+    assert SharedCache("default", key=OTHER_KEY, ttl=30).get("/path/b") is None
+    rotated = SharedCache("default", key=[OTHER_KEY, SHARED_KEY], ttl=30)
+    assert rotated.get("/path/b") == "2"
+
+
+def test_shared_cache_no_key() -> None:
+    with pytest.raises(ImproperlyConfigured):
+        SharedCache("default", key=None, ttl=30)
+
+
+def test_cache_stale() -> None:
+    cache: TTLCache[str] = TTLCache(ttl=30, maxsize=10, stale_ttl=60)
+    with patch("secrets_fields.cache.time.monotonic", return_value=100):
+        cache.set("a", "1")
+        assert cache.get_stale("a") == "1"
+    with patch("secrets_fields.cache.time.monotonic", return_value=140):
+        assert cache.get("a") is None
+        assert cache.get_stale("a") == "1"
+    with patch("secrets_fields.cache.time.monotonic", return_value=200):
+        assert cache.get_stale("a") is None
+        assert cache.get("a") is None
+        assert len(cache) == 0
@@ -0,0 +1,39 @@
+import pytest
+from unittest.mock import patch
+from secrets_fields.circuit import CircuitBreaker
+from secrets_fields.exceptions import CircuitOpenException
+
+
+def test_circuit_breaker() -> None:
+    breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+    with patch("secrets_fields.circuit.time.monotonic", return_value=100):
+        breaker.failure()
+        breaker.failure()
+        breaker.check()
+        breaker.failure()
+        assert breaker.is_open
+        with pytest.raises(CircuitOpenException):
+            breaker.check()
+
+    with patch("secrets_fields.circuit.time.monotonic", return_value=130):
+        # one trial call once the timeout has passed
+        breaker.check()
+        with pytest.raises(CircuitOpenException):
+            breaker.check()
+        breaker.failure()
+        with pytest.raises(CircuitOpenException):
+            breaker.check()
+
+    with patch("secrets_fields.circuit.time.monotonic", return_value=160):
+        breaker.check()
+        breaker.success()
+        assert not breaker.is_open
+        breaker.check()
+
+
+def test_circuit_breaker_disabled() -> None:
+    breaker = CircuitBreaker(threshold=0)
+    for _ in range(10):
+        breaker.failure()
+    breaker.check()
+    assert not breaker.is_open
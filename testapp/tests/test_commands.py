@@ -1,6 +1,21 @@
-from django.core.management import call_command
+import base64
+import json
+import pytest
+from cryptography import fernet
 from cryptography.fernet import Fernet
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import override_settings
 from io import StringIO
+from secrets_fields.management.commands import rotate_secrets
+from secrets_fields.management.utils import pk_ranges
+from testapp.configs import models
+from unittest.mock import patch
+
+KEY = b"5_SgmNvlc9aNe1qePC2VdkJHE9fEUYN4xLVUoVZ6IbM="
+NEW_KEY = b"M2jpxoWkyHXU51ZR0MIEDH0CUkAcivC_TJ-6dpTD29s="
 
 
 def test_generate_fernet_key():
@@ -16,3 +31,373 @@ def test_generate_fernet_key():
         "Store this key in a safe place, such as your environment variables or a secrets manager."
         in output[1]
     )
+
+
+def _insert_raw(model, values):
+    with connection.cursor() as cursor:
+        for value in values:
+            cursor.execute(
+                f"INSERT INTO {model._meta.db_table} (secret) VALUES (%s)", [value]
+            )
+
+
+def _select_raw(model):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT secret FROM {model._meta.db_table} ORDER BY id")
+        return [row[0] for row in cursor.fetchall()]
+
+
+@pytest.mark.django_db
+@override_settings(DJANGO_SECRETS_FIELDS_MIGRATE=True)
+def test_migrate_encrypted_batches():
+    _insert_raw(models.ModelTextStatic, [f"secret-{i}" for i in range(5)])
+    _insert_raw(models.ModelJSONStatic, ['{"test": "123"}'])
+
+    out = StringIO()
+    call_command(
+        "migrate_encrypted",
+        "--batch-size=2",
+        f"--model={models.ModelTextStatic._meta.label}",
+        stdout=out,
+    )
+    output = out.getvalue()
+    label = models.ModelTextStatic._meta.label
+    assert f"{label}: 2 rows updated" in output
+    assert f"{label}: 5 rows updated" in output
+    assert "Successfully updated 5 records" in output
+
+    crypter = fernet.Fernet(KEY)
+    for i, value in enumerate(_select_raw(models.ModelTextStatic)):
+        assert value.startswith("v1|")
+        assert crypter.decrypt(value[3:].encode("utf-8")) == f"secret-{i}".encode()
+    # other models are left alone
+    assert _select_raw(models.ModelJSONStatic) == ['{"test": "123"}']
+
+
+@pytest.mark.django_db
+def test_migrate_encrypted_unknown_model():
+    with pytest.raises(CommandError):
+        call_command("migrate_encrypted", "--model=configs.Missing")
+    with pytest.raises(CommandError):
+        call_command("migrate_encrypted", "--model=auth.User")
+
+
+@pytest.mark.django_db
+@override_settings(DJANGO_SECRETS_FIELDS_MIGRATE=True)
+def test_migrate_encrypted_resume(tmp_path):
+    _insert_raw(models.ModelTextStatic, [f"secret-{i}" for i in range(5)])
+    checkpoint = tmp_path / "checkpoint.json"
+    bulk_update = QuerySet.bulk_update
+    calls = []
+
+    def fail_second_batch(self, objs, fields, *args, **kwargs):
+        calls.append([obj.pk for obj in objs])
+        if len(calls) == 2:
+            raise KeyboardInterrupt()
+        return bulk_update(self, objs, fields, *args, **kwargs)
+
+    with patch.object(QuerySet, "bulk_update", fail_second_batch):
+        with pytest.raises(KeyboardInterrupt):
+            call_command(
+                "migrate_encrypted",
+                "--batch-size=2",
+                f"--checkpoint={checkpoint}",
+                stdout=StringIO(),
+            )
+    first_batch = calls[0]
+    assert json.loads(checkpoint.read_text()) == {
+        models.ModelTextStatic._meta.label: first_batch[-1]
+    }
+    values = _select_raw(models.ModelTextStatic)
+    assert [value.startswith("v1|") for value in values] == [True] * 2 + [False] * 3
+
+    with patch.object(
+        QuerySet, "bulk_update", autospec=True, side_effect=bulk_update
+    ) as mock_bulk_update:
+        call_command(
+            "migrate_encrypted",
+            "--batch-size=3",
+            f"--checkpoint={checkpoint}",
+            stdout=StringIO(),
+        )
+    # only the remaining rows are processed
+    assert mock_bulk_update.call_count == 1
+    pks = [obj.pk for obj in mock_bulk_update.call_args.args[1]]
+    assert len(pks) == 3
+    assert all(pk > first_batch[-1] for pk in pks)
+    assert all(value.startswith("v1|") for value in _select_raw(models.ModelTextStatic))
+    assert not checkpoint.exists()
+
+
+@pytest.mark.django_db
+@override_settings(DJANGO_SECRETS_FIELDS_MIGRATE=True)
+def test_migrate_encrypted_only_legacy_rows():
+    migrated = models.ModelTextStatic.objects.create(secret="migrated")
+    models.ModelTextStatic.objects.create(secret=None)
+    _insert_raw(models.ModelTextStatic, ["legacy-1", "legacy-2"])
+    ciphertext = _select_raw(models.ModelTextStatic)[0]
+    label = models.ModelTextStatic._meta.label
+
+    out = StringIO()
+    with patch.object(QuerySet, "bulk_update") as mock_bulk_update:
+        call_command("migrate_encrypted", "--dry-run", stdout=out)
+        assert mock_bulk_update.call_count == 0
+    assert f"{label}: 2 rows need migrating" in out.getvalue()
+    assert "2 records need migrating" in out.getvalue()
+
+    out = StringIO()
+    call_command("migrate_encrypted", stdout=out)
+    assert "Successfully updated 2 records" in out.getvalue()
+    values = _select_raw(models.ModelTextStatic)
+    # rows already in the current format are not rewritten
+    assert values[0] == ciphertext
+    assert values[1] is None
+    assert all(value.startswith("v1|") for value in values[2:])
+    assert models.ModelTextStatic.objects.get(pk=migrated.pk).secret.get() == "migrated"
+
+    out = StringIO()
+    call_command("migrate_encrypted", stdout=out)
+    assert "Successfully updated 0 records" in out.getvalue()
+
+
+@pytest.mark.django_db
+@override_settings(DJANGO_SECRETS_FIELDS_MIGRATE=True)
+def test_migrate_encrypted_blind_index():
+    model = models.ModelTextIndexed
+    label = model._meta.label
+    # a row saved before blind_index=True was added, and a legacy plaintext row
+    model.objects.create(secret="token-1")
+    model.objects.update(secret_index=None)
+    ciphertext = _select_raw(model)[0]
+    _insert_raw(model, ["token-2"])
+    assert not model.objects.filter(secret="token-1").exists()
+
+    out = StringIO()
+    call_command("migrate_encrypted", f"--model={label}", "--dry-run", stdout=out)
+    assert f"{label}: 2 rows need migrating" in out.getvalue()
+
+    out = StringIO()
+    call_command("migrate_encrypted", f"--model={label}", stdout=out)
+    assert "Successfully updated 2 records" in out.getvalue()
+    # the current ciphertext is kept, only its index is added
+    assert _select_raw(model)[0] == ciphertext
+    assert model.objects.get(secret="token-1").secret.get() == "token-1"
+    assert model.objects.get(secret="token-2").secret.get() == "token-2"
+
+    out = StringIO()
+    call_command("migrate_encrypted", f"--model={label}", stdout=out)
+    assert "Successfully updated 0 records" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_pk_ranges():
+    models.ModelTextStatic.objects.bulk_create(
+        [models.ModelTextStatic(id=i) for i in range(1, 11)]
+    )
+    queryset = models.ModelTextStatic.objects.all()
+    assert pk_ranges(queryset, 3) == [(1, 4), (5, 8), (9, 10)]
+    assert pk_ranges(queryset, 1) == [(1, 10)]
+    assert pk_ranges(queryset, 20)[-1] == (10, 10)
+    assert pk_ranges(queryset.none(), 3) == []
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(DJANGO_SECRETS_FIELDS_MIGRATE=True)
+def test_migrate_encrypted_workers():
+    _insert_raw(models.ModelTextStatic, [f"secret-{i}" for i in range(10)])
+    _insert_raw(models.ModelJSONStatic, ['{"test": "123"}'])
+
+    out = StringIO()
+    call_command("migrate_encrypted", "--workers=3", "--batch-size=2", stdout=out)
+    assert "Successfully updated 11 records" in out.getvalue()
+
+    crypter = fernet.Fernet(KEY)
+    for i, value in enumerate(_select_raw(models.ModelTextStatic)):
+        assert crypter.decrypt(value[3:].encode("utf-8")) == f"secret-{i}".encode()
+    value = _select_raw(models.ModelJSONStatic)[0]
+    assert json.loads(crypter.decrypt(value[3:].encode("utf-8"))) == {"test": "123"}
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(DJANGO_SECRETS_FIELDS_MIGRATE=True)
+def test_migrate_encrypted_workers_errors(tmp_path):
+    _insert_raw(models.ModelTextStatic, [f"secret-{i}" for i in range(10)])
+    checkpoint = tmp_path / "checkpoint.json"
+    label = models.ModelTextStatic._meta.label
+    bulk_update = QuerySet.bulk_update
+    # primary keys are not reset between transactional tests
+    pks = list(
+        models.ModelTextStatic.objects.order_by("pk").values_list("pk", flat=True)
+    )
+    failed_range = f"{label}:{pks[5]}:{pks[9]}"
+
+    def fail_range(self, objs, fields, *args, **kwargs):
+        if any(obj.pk > pks[4] for obj in objs):
+            raise ValueError("range failed")
+        return bulk_update(self, objs, fields, *args, **kwargs)
+
+    err = StringIO()
+    with patch.object(QuerySet, "bulk_update", fail_range):
+        with pytest.raises(CommandError, match="1 of 2 ranges failed"):
+            call_command(
+                "migrate_encrypted",
+                "--workers=2",
+                f"--model={label}",
+                f"--checkpoint={checkpoint}",
+                stdout=StringIO(),
+                stderr=err,
+            )
+    assert f"{failed_range}: failed: range failed" in err.getvalue()
+    # the other range is unaffected
+    values = _select_raw(models.ModelTextStatic)
+    assert all(value.startswith("v1|") for value in values[:5])
+    assert not any(value.startswith("v1|") for value in values[5:])
+
+    # the failed range is retried from the checkpoint
+    out = StringIO()
+    call_command(
+        "migrate_encrypted",
+        "--workers=2",
+        f"--model={label}",
+        f"--checkpoint={checkpoint}",
+        stdout=out,
+    )
+    assert "Successfully updated 5 records" in out.getvalue()
+    assert f"{failed_range}: 5 rows updated" in out.getvalue()
+    assert all(value.startswith("v1|") for value in _select_raw(models.ModelTextStatic))
+
+
+ROTATED_SETTINGS = {
+    "static": {
+        "backend": "secrets_fields.backends.encrypted.EncryptedBackend",
+        "encryption_key": [NEW_KEY, KEY],
+    },
+}
+
+
+@pytest.mark.django_db
+def test_rotate_secrets(tmp_path):
+    for i in range(3):
+        models.ModelTextStatic.objects.create(secret=f"secret-{i}")
+    models.ModelTextStatic.objects.create(secret=None)
+    models.ModelJSONStatic.objects.create(secret={"test": "123"})
+
+    with override_settings(DJANGO_SECRETS_FIELDS=ROTATED_SETTINGS):
+        out = StringIO()
+        call_command(
+            "rotate_secrets",
+            "--batch-size=2",
+            f"--checkpoint={tmp_path / 'checkpoint.json'}",
+            stdout=out,
+        )
+        assert "Successfully rotated 4 records" in out.getvalue()
+        assert not (tmp_path / "checkpoint.json").exists()
+
+        crypter = fernet.Fernet(NEW_KEY)
+        values = _select_raw(models.ModelTextStatic)
+        for i, value in enumerate(values[:3]):
+            assert crypter.decrypt(value[3:].encode("utf-8")) == f"secret-{i}".encode()
+        assert values[3] is None
+        value = _select_raw(models.ModelJSONStatic)[0]
+        assert json.loads(crypter.decrypt(value[3:].encode("utf-8"))) == {"test": "123"}
+        assert models.ModelJSONStatic.objects.get().secret == {"test": "123"}
+
+        # nothing left to rotate
+        out = StringIO()
+        with patch.object(QuerySet, "bulk_update") as mock_bulk_update:
+            call_command("rotate_secrets", stdout=out)
+            assert mock_bulk_update.call_count == 0
+        assert "Successfully rotated 0 records" in out.getvalue()
+
+
+def _select_raw_binary(model):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT secret FROM {model._meta.db_table} ORDER BY id")
+        return [None if row[0] is None else bytes(row[0]) for row in cursor.fetchall()]
+
+
+@pytest.mark.django_db
+def test_rotate_secrets_concurrent_write():
+    instances = [
+        models.ModelTextStatic.objects.create(secret=f"secret-{i}") for i in range(2)
+    ]
+    iter_batches = rotate_secrets.iter_batches
+
+    def write_after_read(*args, **kwargs):
+        for batch in iter_batches(*args, **kwargs):
+            # the application saves a new value after the batch was read
+            instances[0].secret = "changed"
+            instances[0].save()
+            yield batch
+
+    with (
+        override_settings(DJANGO_SECRETS_FIELDS=ROTATED_SETTINGS),
+        patch.object(rotate_secrets, "iter_batches", write_after_read),
+    ):
+        call_command(
+            "rotate_secrets",
+            f"--model={models.ModelTextStatic._meta.label}",
+            stdout=StringIO(),
+        )
+
+        crypter = fernet.Fernet(NEW_KEY)
+        values = _select_raw(models.ModelTextStatic)
+        assert [crypter.decrypt(value[3:].encode("utf-8")) for value in values] == [
+            b"changed",
+            b"secret-1",
+        ]
+
+
+@pytest.mark.django_db
+def test_rotate_secrets_binary():
+    models.ModelBinaryStatic.objects.create(secret=b"\x00\x01")
+    models.ModelBinaryStatic.objects.create(secret=None)
+    label = models.ModelBinaryStatic._meta.label
+
+    with override_settings(DJANGO_SECRETS_FIELDS=ROTATED_SETTINGS):
+        out = StringIO()
+        call_command("rotate_secrets", f"--model={label}", stdout=out)
+        assert "Successfully rotated 1 records" in out.getvalue()
+
+        stored = _select_raw_binary(models.ModelBinaryStatic)
+        assert stored[1] is None
+        token = base64.urlsafe_b64encode(stored[0][1:])
+        assert fernet.Fernet(NEW_KEY).decrypt(token) == b"\x00\x01"
+
+        out = StringIO()
+        call_command("rotate_secrets", f"--model={label}", stdout=out)
+        assert "Successfully rotated 0 records" in out.getvalue()
+        assert _select_raw_binary(models.ModelBinaryStatic) == stored
+
+    # readable with the new key alone
+    with override_settings(
+        DJANGO_SECRETS_FIELDS={
+            "static": {
+                "backend": "secrets_fields.backends.encrypted.EncryptedBackend",
+                "encryption_key": NEW_KEY,
+            },
+        }
+    ):
+        values = models.ModelBinaryStatic.objects.order_by("pk")
+        assert [instance.secret for instance in values] == [b"\x00\x01", None]
+
+
+@pytest.mark.django_db
+def test_rotate_secrets_throttle():
+    for i in range(4):
+        models.ModelTextStatic.objects.create(secret=f"secret-{i}")
+
+    with override_settings(DJANGO_SECRETS_FIELDS=ROTATED_SETTINGS):
+        with patch(
+            "secrets_fields.management.commands.rotate_secrets.time.sleep"
+        ) as mock_sleep:
+            call_command(
+                "rotate_secrets",
+                f"--model={models.ModelTextStatic._meta.label}",
+                "--batch-size=2",
+                "--max-rows-per-second=10",
+                stdout=StringIO(),
+            )
+    assert mock_sleep.call_count == 2
+    # 2 rows at 10 rows/s take at least 0.2s
+    assert 0 < mock_sleep.call_args_list[0].args[0] <= 0.2
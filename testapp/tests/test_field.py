@@ -1,13 +1,19 @@
+import copy
 import json
+import pickle
 import pytest
 from cryptography import fernet
 from moto import mock_aws
-from unittest.mock import patch
+from unittest.mock import PropertyMock, patch
 from testapp.configs import models
 from mixer.backend.django import mixer
 from django.test import override_settings
 from django.db import connection
+from django.db.models import F
+from django.core.exceptions import ImproperlyConfigured
 from secrets_fields.exceptions import DecryptionException
+from secrets_fields.fields import SecretJSON, SecretText
+from secrets_fields.util import get_backend
 
 from secrets_fields.management.commands.migrate_encrypted import (
     Command as MigrateEncryptedCommand,
@@ -291,3 +297,362 @@ def test_model_json_field_list_secrets_manager_role() -> None:
 
     instance = models.ModelJSONAWS.objects.first()
     assert instance.secret == [1, 2, 3]
+
+
+@mock_aws
+@pytest.mark.django_db
+def test_model_json_field_lazy() -> None:
+    models.ModelJSONLazyAWS.objects.create(secret={"test": "supersecret"})
+    models.ModelJSONLazyAWS.objects.create(secret=None)
+    get_backend("aws").invalidate()
+
+    with patch(
+        "secrets_fields.backends.secretsmanager.SecretsManagerBackend.decrypt",
+        wraps=get_backend("aws").decrypt,
+    ) as mock_decrypt:
+        instances = list(models.ModelJSONLazyAWS.objects.order_by("pk"))
+        assert [instance.pk for instance in instances]
+        assert mock_decrypt.call_count == 0
+
+        instance = instances[0]
+        assert isinstance(instance.__dict__["secret"], SecretJSON)
+        assert instance.secret == {"test": "supersecret"}
+        assert instance.secret["test"] == "supersecret"
+        assert mock_decrypt.call_count == 1
+        assert instances[1].secret is None
+
+    assert json.dumps(instance.secret) == '{"test": "supersecret"}'
+    field = models.ModelJSONLazyAWS._meta.get_field("secret")
+    assert field.value_from_object(instance) == '{"test": "supersecret"}'
+
+    instance.save()
+    instance = models.ModelJSONLazyAWS.objects.get(pk=instance.pk)
+    assert instance.secret == {"test": "supersecret"}
+
+
+def test_model_json_field_values() -> None:
+    instance = models.ModelJSONStatic.objects.create(secret={"test": "supersecret"})
+    values = list(models.ModelJSONStatic.objects.values_list("secret", flat=True))
+    assert values == [{"test": "supersecret"}]
+    assert json.dumps(values) == '[{"test": "supersecret"}]'
+    assert list(models.ModelJSONStatic.objects.values()) == [
+        {"id": instance.pk, "secret": {"test": "supersecret"}}
+    ]
+
+    secret = models.ModelJSONStatic.objects.get().__dict__["secret"]
+    assert str(secret) == "{'test': 'supersecret'}"
+    assert repr(secret) == "{'test': 'supersecret'}"
+
+
+@mock_aws
+def test_model_json_field_lazy_values() -> None:
+    models.ModelJSONLazyAWS.objects.create(secret={"test": "supersecret"})
+    models.ModelJSONLazyAWS.objects.create(secret=None)
+    queryset = models.ModelJSONLazyAWS.objects.order_by("pk")
+
+    # rows that are not model instances get the decoded JSON
+    values = list(queryset.values_list("secret", flat=True))
+    assert values == [{"test": "supersecret"}, None]
+    assert json.dumps(values) == '[{"test": "supersecret"}, null]'
+    assert list(queryset.values("secret")) == [
+        {"secret": {"test": "supersecret"}},
+        {"secret": None},
+    ]
+    # instances still decrypt on access
+    assert isinstance(queryset.first().__dict__["secret"], SecretJSON)
+
+
+@mock_aws
+@pytest.mark.django_db
+def test_model_json_field_lazy_prefetch() -> None:
+    models.ModelJSONLazyAWS.objects.create(secret=[1, 2, 3])
+    get_backend("aws").invalidate()
+
+    instance = models.ModelJSONLazyAWS.objects.prefetch_secrets().get()
+    assert isinstance(instance.__dict__["secret"], SecretJSON)
+    with patch(
+        "secrets_fields.backends.secretsmanager.SecretsManagerBackend.decrypt"
+    ) as mock_decrypt:
+        assert instance.secret == [1, 2, 3]
+        assert mock_decrypt.call_count == 0
+
+
+def test_secret_memoized() -> None:
+    instance = models.ModelTextStatic.objects.create(secret="supersecret")
+    instance = models.ModelTextStatic.objects.get(pk=instance.pk)
+    with patch(
+        "secrets_fields.backends.encrypted.EncryptedBackend.decrypt",
+        wraps=get_backend("static").decrypt,
+    ) as mock_decrypt:
+        assert instance.secret.get() == "supersecret"
+        assert instance.secret.plaintext == "supersecret"
+        assert str(instance.secret) == "supersecret"
+        assert repr(instance.secret) == "supersecret"
+        assert mock_decrypt.call_count == 1
+
+        assert instance.secret.get(refresh=True) == "supersecret"
+        assert mock_decrypt.call_count == 2
+
+        # a new ciphertext drops the decrypted value
+        instance.secret.ciphertext = SecretText(
+            plaintext="other", backend="static"
+        ).ciphertext
+        assert instance.secret.get() == "other"
+        assert mock_decrypt.call_count == 3
+
+
+@mock_aws
+def test_secret_refresh_secrets_manager() -> None:
+    instance = models.ModelTextAWS.objects.create(secret="supersecret")
+    instance = models.ModelTextAWS.objects.get(pk=instance.pk)
+    assert instance.secret.get() == "supersecret"
+
+    with patch(
+        "secrets_fields.backends.secretsmanager.SecretsManagerBackend.client_ro",
+        new_callable=PropertyMock,
+    ) as mock_client:
+        mock_client.return_value.get_secret_value.return_value = {
+            "SecretString": "rotated"
+        }
+        assert instance.secret.get() == "supersecret"
+        assert instance.secret.get(refresh=True) == "rotated"
+        assert mock_client.return_value.get_secret_value.call_count == 1
+
+
+def test_json_field_save_unchanged() -> None:
+    instance = models.ModelJSONStatic.objects.create(secret={"test": "supersecret"})
+    instance = models.ModelJSONStatic.objects.get(pk=instance.pk)
+    ciphertext = instance.__dict__["secret"].ciphertext
+
+    with patch(
+        "secrets_fields.backends.encrypted.EncryptedBackend.encrypt",
+        wraps=get_backend("static").encrypt,
+    ) as mock_encrypt:
+        assert instance.secret == {"test": "supersecret"}
+        instance.save()
+        assert mock_encrypt.call_count == 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT secret FROM {models.ModelJSONStatic._meta.db_table} WHERE id = %s",
+                [instance.pk],
+            )
+            assert cursor.fetchone()[0] == ciphertext
+
+        # modified in place
+        instance.secret["test"] = "changed"
+        instance.save()
+        assert mock_encrypt.call_count == 1
+
+        instance = models.ModelJSONStatic.objects.get(pk=instance.pk)
+        assert instance.secret == {"test": "changed"}
+        instance.secret = {"test": "replaced"}
+        instance.save()
+        assert mock_encrypt.call_count == 2
+
+    instance = models.ModelJSONStatic.objects.get(pk=instance.pk)
+    assert instance.secret == {"test": "replaced"}
+
+
+@mock_aws
+def test_json_field_save_unchanged_secrets_manager() -> None:
+    instance = models.ModelJSONAWS.objects.create(secret={"test": "supersecret"})
+    instance = models.ModelJSONAWS.objects.get(pk=instance.pk)
+
+    with patch(
+        "secrets_fields.backends.secretsmanager.SecretsManagerBackend.client_ro",
+        new_callable=PropertyMock,
+    ) as mock_client:
+        instance.save()
+        assert mock_client.return_value.get_secret_value.call_count == 0
+
+
+def test_blind_index_lookup() -> None:
+    models.ModelTextIndexed.objects.create(secret="token-1")
+    models.ModelTextIndexed.objects.create(secret="token-2")
+    models.ModelTextIndexed.objects.create(secret=None)
+
+    with patch(
+        "secrets_fields.backends.encrypted.EncryptedBackend.decrypt"
+    ) as mock_decrypt:
+        qs = models.ModelTextIndexed.objects.filter(secret="token-2")
+        assert "secret_index" in str(qs.query)
+        instance = qs.get()
+        assert (
+            models.ModelTextIndexed.objects.filter(secret__exact="token-1").count() == 1
+        )
+        assert not models.ModelTextIndexed.objects.filter(secret="other").exists()
+        assert models.ModelTextIndexed.objects.filter(secret__isnull=True).count() == 1
+        assert mock_decrypt.call_count == 0
+    assert instance.secret.get() == "token-2"
+
+
+def test_blind_index_update() -> None:
+    instance = models.ModelTextIndexed.objects.create(secret="token-1")
+    index = instance.secret_index
+    assert index == get_backend("static").blind_index("token-1")
+
+    instance = models.ModelTextIndexed.objects.get(pk=instance.pk)
+    instance.save()
+    assert instance.secret_index == index
+
+    instance.secret = "token-2"
+    instance.save()
+    assert models.ModelTextIndexed.objects.get(secret="token-2").pk == instance.pk
+    assert not models.ModelTextIndexed.objects.filter(secret="token-1").exists()
+
+    instances = list(models.ModelTextIndexed.objects.all())
+    instances[0].secret = "token-3"
+    models.ModelTextIndexed.objects.bulk_update(instances, ["secret"])
+    assert models.ModelTextIndexed.objects.get(secret="token-3").pk == instance.pk
+
+    models.ModelTextIndexed.objects.bulk_create(
+        [models.ModelTextIndexed(secret="token-4")]
+    )
+    assert models.ModelTextIndexed.objects.filter(secret="token-4").exists()
+
+
+def test_blind_index_partial_update() -> None:
+    instance = models.ModelTextIndexed.objects.create(secret="token-1")
+
+    instance.secret = "token-2"
+    with pytest.raises(ValueError, match="secret_index"):
+        instance.save(update_fields=["secret"])
+    instance.save(update_fields=["secret", "secret_index"])
+    assert models.ModelTextIndexed.objects.get(secret="token-2").pk == instance.pk
+
+    models.ModelTextIndexed.objects.filter(pk=instance.pk).update(secret="token-3")
+    assert not models.ModelTextIndexed.objects.filter(secret="token-2").exists()
+    assert models.ModelTextIndexed.objects.get(secret="token-3").pk == instance.pk
+
+    models.ModelTextIndexed.objects.update(secret=None)
+    assert models.ModelTextIndexed.objects.get(secret__isnull=True).pk == instance.pk
+    assert not models.ModelTextIndexed.objects.filter(secret="token-3").exists()
+
+    with pytest.raises(ValueError, match="expression"):
+        models.ModelTextIndexed.objects.update(secret=F("secret"))
+
+
+def test_blind_index_json() -> None:
+    models.ModelJSONIndexed.objects.create(secret={"a": 1, "b": 2})
+    assert models.ModelJSONIndexed.objects.filter(secret={"b": 2, "a": 1}).exists()
+    assert not models.ModelJSONIndexed.objects.filter(secret={"a": 2}).exists()
+
+
+def test_blind_index_no_key(settings) -> None:
+    settings.DJANGO_SECRETS_FIELDS = {
+        "static": {
+            "backend": "secrets_fields.backends.encrypted.EncryptedBackend",
+            "encryption_key": b"5_SgmNvlc9aNe1qePC2VdkJHE9fEUYN4xLVUoVZ6IbM=",
+        }
+    }
+    with pytest.raises(ImproperlyConfigured):
+        models.ModelTextIndexed.objects.create(secret="token-1")
+
+
+def test_binary_field() -> None:
+    payload = bytes(range(256))
+    instance = models.ModelBinaryStatic.objects.create(secret=payload)
+    models.ModelBinaryStatic.objects.create(secret=None)
+
+    instances = list(models.ModelBinaryStatic.objects.order_by("pk"))
+    assert instances[0].secret == payload
+    assert instances[1].secret is None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT secret FROM {models.ModelBinaryStatic._meta.db_table} WHERE id = %s",
+            [instance.pk],
+        )
+        stored = bytes(cursor.fetchone()[0])
+    assert payload not in stored
+    # raw bytes instead of base64 text with a version prefix
+    text = SecretText(plaintext="x" * 256, backend="static").ciphertext
+    assert len(stored) < len(text) * 0.8
+
+
+def test_binary_field_invalid() -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {models.ModelBinaryStatic._meta.db_table} (secret) VALUES (%s)",
+            [b"\x02invalid"],
+        )
+    with pytest.raises(DecryptionException):
+        models.ModelBinaryStatic.objects.get()
+
+
+@pytest.mark.parametrize("algorithm", ["zlib", "zstd"])
+def test_json_field_compression(settings, algorithm: str) -> None:
+    if algorithm == "zstd":
+        pytest.importorskip("zstandard")
+    settings.DJANGO_SECRETS_FIELDS = {
+        "static": {
+            **settings.DJANGO_SECRETS_FIELDS["static"],
+            "compression": algorithm,
+            "compression_threshold": 100,
+        }
+    }
+    bundle = {"certificates": ["-----BEGIN CERTIFICATE-----" * 100] * 20}
+    instance = models.ModelJSONStatic.objects.create(secret=bundle)
+    small = models.ModelJSONStatic.objects.create(secret={"a": 1})
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id, secret FROM {models.ModelJSONStatic._meta.db_table} ORDER BY id"
+        )
+        stored = dict(cursor.fetchall())
+    assert stored[instance.pk].startswith(f"v1+{algorithm}|")
+    assert len(stored[instance.pk]) < len(json.dumps(bundle)) / 10
+    assert stored[small.pk].startswith("v1|")
+
+    assert models.ModelJSONStatic.objects.get(pk=instance.pk).secret == bundle
+    assert models.ModelJSONStatic.objects.get(pk=small.pk).secret == {"a": 1}
+    assert (
+        models.ModelJSONStatic.objects.prefetch_secrets().get(pk=instance.pk).secret
+        == bundle
+    )
+
+    # still readable once compression is turned off
+    settings.DJANGO_SECRETS_FIELDS = {
+        "static": {
+            "backend": "secrets_fields.backends.encrypted.EncryptedBackend",
+            "encryption_key": b"5_SgmNvlc9aNe1qePC2VdkJHE9fEUYN4xLVUoVZ6IbM=",
+        }
+    }
+    assert models.ModelJSONStatic.objects.get(pk=instance.pk).secret == bundle
+
+
+@mock_aws
+def test_json_field_compression_secrets_manager(settings) -> None:
+    settings.DJANGO_SECRETS_FIELDS = {
+        "aws": {**settings.DJANGO_SECRETS_FIELDS["aws"], "compression": "zlib"}
+    }
+    bundle = {"key": "x" * 10000}
+    models.ModelJSONAWS.objects.bulk_create([models.ModelJSONAWS(secret=bundle)])
+    get_backend("aws").invalidate()
+    assert models.ModelJSONAWS.objects.get().secret == bundle
+
+
+@mock_aws
+def test_secret_pickle() -> None:
+    instance = models.ModelTextAWS.objects.create(secret="supersecret")
+    instance = models.ModelTextAWS.objects.get(pk=instance.pk)
+    assert instance.secret.get() == "supersecret"
+    json_instance = models.ModelJSONAWS.objects.create(secret={"test": "jsonsecret"})
+    json_instance = models.ModelJSONAWS.objects.get(pk=json_instance.pk)
+
+    # decrypted values are not pickled, caches only hold the ciphertext
+    assert b"supersecret" not in pickle.dumps(instance)
+    assert b"jsonsecret" not in pickle.dumps(json_instance)
+    secret = SecretText(plaintext="topsecret", backend="static")
+    assert secret.get() == "topsecret"
+    assert b"topsecret" not in pickle.dumps(secret)
+    assert pickle.loads(pickle.dumps(secret)).get() == "topsecret"
+
+    for copied in (pickle.loads(pickle.dumps(instance)), copy.deepcopy(instance)):
+        assert copied.secret.get() == "supersecret"
+        assert copied.secret.ciphertext == instance.secret.ciphertext
+    for copied in (
+        pickle.loads(pickle.dumps(json_instance)),
+        copy.deepcopy(json_instance),
+    ):
+        assert copied.secret == {"test": "jsonsecret"}
@@ -0,0 +1,174 @@
+import pytest
+from cryptography.fernet import Fernet
+from django.test import override_settings
+from moto import mock_aws
+from secrets_fields import instrumentation
+from secrets_fields.backends.secretsmanager import SecretsManagerBackend
+from secrets_fields.exceptions import DecryptionException
+from secrets_fields.instrumentation import Event
+from secrets_fields.util import get_backend
+from testapp.configs import models
+from unittest.mock import Mock, patch
+
+
+@pytest.fixture
+def events():
+    events = []
+    instrumentation.add_observer(events.append)
+    yield events
+    instrumentation.remove_observer(events.append)
+
+
+@pytest.mark.django_db
+def test_field_events(events):
+    label = models.ModelTextStatic._meta.label
+    instance = models.ModelTextStatic.objects.create(secret="plaintext")
+    assert [
+        (e.operation, e.backend, e.model, e.field, e.size, e.outcome) for e in events
+    ] == [
+        ("encrypt", "static", label, "secret", 9, "ok"),
+    ]
+
+    events.clear()
+    instance = models.ModelTextStatic.objects.get(pk=instance.pk)
+    assert instance.secret.get() == "plaintext"
+    assert [(e.operation, e.model, e.field, e.size, e.outcome) for e in events] == [
+        ("decrypt", label, "secret", 9, "ok"),
+    ]
+    assert events[0].duration >= 0
+
+
+@pytest.mark.django_db
+def test_binary_field_events(events):
+    instance = models.ModelBinaryStatic.objects.create(secret=b"\x00\x01")
+    models.ModelBinaryStatic.objects.get(pk=instance.pk)
+    assert [(e.operation, e.field, e.size) for e in events] == [
+        ("encrypt", "secret", 2),
+        ("decrypt", "secret", 2),
+    ]
+
+
+def test_error_event(events):
+    instance = models.ModelTextStatic(secret=None)
+    instance.secret = models.ModelTextStatic._meta.get_field("secret").from_db_value(
+        "v1|invalid", None, None
+    )
+    with pytest.warns(UserWarning), pytest.raises(DecryptionException):
+        instance.secret.get()
+    assert len(events) == 1
+    assert events[0].outcome == "error"
+    assert isinstance(events[0].error, DecryptionException)
+    assert events[0].size == 0
+
+
+@pytest.mark.django_db
+def test_bulk_events(events):
+    models.ModelTextStatic.objects.bulk_create(
+        [models.ModelTextStatic(secret=value) for value in ("a", "b", "a")]
+    )
+    assert [(e.operation, e.model, e.field, e.size) for e in events] == [
+        ("encrypt_many", models.ModelTextStatic._meta.label, None, 2),
+    ]
+
+
+@mock_aws
+def test_cache_events(events):
+    backend = get_backend("aws")
+    name = backend.encrypt("plaintext")
+    backend.invalidate()
+    events.clear()
+
+    backend.decrypt(name)
+    backend.decrypt(name)
+    cache = [(e.operation, e.backend, e.size, e.outcome) for e in events]
+    assert cache == [
+        ("cache", "aws", 0, "miss"),
+        ("cache", "aws", 9, "hit"),
+    ]
+
+
+@mock_aws
+def test_shared_cache_events(events):
+    backend = SecretsManagerBackend(
+        {
+            "prefix": "/path/",
+            "shared_cache": "default",
+            "shared_cache_key": Fernet.generate_key(),
+        }
+    )
+    name = backend.encrypt("plaintext")
+    backend.cache.invalidate()
+    events.clear()
+
+    backend.decrypt(name)
+    assert [(e.operation, e.backend, e.outcome) for e in events] == [
+        ("cache", None, "miss"),
+        ("shared_cache", None, "hit"),
+    ]
+
+
+def test_no_observers():
+    func = Mock(return_value="result")
+    with patch.object(instrumentation, "notify") as notify:
+        assert instrumentation.call("decrypt", "static", func, "arg") == "result"
+        instrumentation.record("cache", "static", 0.0, 0, "hit")
+    func.assert_called_once_with("arg")
+    notify.assert_not_called()
+    assert not instrumentation.enabled()
+
+
+def test_failing_observer(events, caplog):
+    def fail(event):
+        raise ValueError("broken")
+
+    instrumentation.add_observer(fail)
+    try:
+        assert instrumentation.call("decrypt", "static", str.upper, "a") == "A"
+    finally:
+        instrumentation.remove_observer(fail)
+    assert len(events) == 1
+    assert "failed" in caplog.text
+
+
+def test_load_observers():
+    with override_settings(DJANGO_SECRETS_FIELDS_OBSERVERS=["unittest.mock.Mock"]):
+        instrumentation.load_observers()
+    (observer,) = instrumentation._observers
+    try:
+        instrumentation.record("cache", "static", 0.5, 1, "hit")
+        observer.assert_called_once_with(
+            Event("cache", "static", None, None, 0.5, 1, "hit")
+        )
+    finally:
+        instrumentation.remove_observer(observer)
+
+
+def test_prometheus_observer():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    from secrets_fields.prometheus import PrometheusObserver
+
+    registry = prometheus_client.CollectorRegistry()
+    observer = PrometheusObserver(registry=registry)
+    observer(Event("decrypt", "aws", "configs.Model", "secret", 0.25, 10, "ok"))
+    observer(Event("cache", "aws", None, None, 0.001, 0, "miss"))
+
+    labels = {
+        "operation": "decrypt",
+        "backend": "aws",
+        "model": "configs.Model",
+        "field": "secret",
+        "outcome": "ok",
+    }
+    sample = registry.get_sample_value
+    assert sample("secrets_fields_operations_total", labels) == 1
+    assert sample("secrets_fields_operation_duration_seconds_sum", labels) == 0.25
+    assert sample("secrets_fields_bytes_total", labels) == 10
+    cache = {
+        **labels,
+        "operation": "cache",
+        "model": "",
+        "field": "",
+        "outcome": "miss",
+    }
+    assert sample("secrets_fields_operations_total", cache) == 1
+    assert sample("secrets_fields_bytes_total", cache) is None
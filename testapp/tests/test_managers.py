@@ -0,0 +1,234 @@
+import boto3
+import pytest
+from moto import mock_aws
+from unittest.mock import patch
+from testapp.configs import models
+from secrets_fields.fields import SecretJSON, SecretText, deferred_decryption
+from secrets_fields.managers import SecretQuerySet
+from secrets_fields.util import get_backend
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def client():
+    # a single client so calls to AWS can be counted
+    with mock_aws():
+        client = boto3.client("secretsmanager")
+        with patch(
+            "secrets_fields.backends.secretsmanager.get_client", return_value=client
+        ):
+            yield client
+
+
+def test_manager_queryset() -> None:
+    assert isinstance(models.ModelTextAWS.objects.all(), SecretQuerySet)
+    qs = models.ModelTextAWS.objects.prefetch_secrets("secret").filter(pk=1)
+    assert qs._prefetch_secret_fields == ("secret",)
+
+
+def test_prefetch_secrets_text(client) -> None:
+    for i in range(45):
+        models.ModelTextAWS.objects.create(secret=f"secret-{i}")
+    get_backend("aws").invalidate()
+
+    with (
+        patch.object(
+            client, "batch_get_secret_value", wraps=client.batch_get_secret_value
+        ) as mock_batch,
+        patch.object(
+            client, "get_secret_value", wraps=client.get_secret_value
+        ) as mock_get,
+    ):
+        instances = list(models.ModelTextAWS.objects.prefetch_secrets().order_by("pk"))
+        get_backend("aws").invalidate()
+        assert [instance.secret.get() for instance in instances] == [
+            f"secret-{i}" for i in range(45)
+        ]
+        # 45 secrets in chunks of 20
+        assert mock_batch.call_count == 3
+        assert mock_get.call_count == 0
+
+
+def test_prefetch_secrets_json(client) -> None:
+    models.ModelJSONAWS.objects.create(secret={"test": "supersecret"})
+    models.ModelJSONAWS.objects.create(secret=[1, 2, 3])
+    models.ModelJSONAWS.objects.create(secret=None)
+    get_backend("aws").invalidate()
+
+    with patch.object(
+        client, "get_secret_value", wraps=client.get_secret_value
+    ) as mock_get:
+        instances = list(models.ModelJSONAWS.objects.prefetch_secrets().order_by("pk"))
+        assert mock_get.call_count == 0
+    assert [instance.secret for instance in instances] == [
+        {"test": "supersecret"},
+        [1, 2, 3],
+        None,
+    ]
+
+
+def test_prefetch_secrets_sequential(client, settings) -> None:
+    settings.DJANGO_SECRETS_FIELDS = {
+        "aws": {**settings.DJANGO_SECRETS_FIELDS["aws"], "batch_workers": 1}
+    }
+    for i in range(25):
+        models.ModelTextAWS.objects.create(secret=f"secret-{i}")
+    get_backend("aws").invalidate()
+
+    with patch.object(
+        client, "batch_get_secret_value", wraps=client.batch_get_secret_value
+    ) as mock_batch:
+        instances = list(models.ModelTextAWS.objects.prefetch_secrets())
+        assert mock_batch.call_count == 2
+    assert {instance.secret.get() for instance in instances} == {
+        f"secret-{i}" for i in range(25)
+    }
+
+
+def test_prefetch_secrets_static() -> None:
+    models.ModelJSONStatic.objects.create(secret={"test": "supersecret"})
+    models.ModelTextStatic.objects.create(secret="supersecret")
+
+    instance = models.ModelJSONStatic.objects.prefetch_secrets().get()
+    assert instance.secret == {"test": "supersecret"}
+    instance = models.ModelTextStatic.objects.prefetch_secrets().get()
+    assert isinstance(instance.secret, SecretText)
+    assert instance.secret.get() == "supersecret"
+
+
+def test_deferred_decryption_only_in_prefetch() -> None:
+    models.ModelJSONStatic.objects.create(secret={"test": "supersecret"})
+    models.ModelJSONStatic.objects.prefetch_secrets().get()
+    instance = models.ModelJSONStatic.objects.get()
+    assert not isinstance(instance.secret, SecretJSON)
+
+
+def test_deferred_decryption_nested() -> None:
+    models.ModelJSONStatic.objects.create(secret={"test": "supersecret"})
+    with deferred_decryption():
+        with deferred_decryption():
+            pass
+        # leaving the inner block keeps the outer one deferred
+        instance = models.ModelJSONStatic.objects.get()
+        assert not instance.__dict__["secret"]._is_decrypted
+    instance = models.ModelJSONStatic.objects.get()
+    assert instance.__dict__["secret"]._is_decrypted
+
+
+def test_bulk_create_text(client) -> None:
+    objs = [models.ModelTextAWS(secret=f"secret-{i % 10}") for i in range(30)]
+    objs.append(models.ModelTextAWS(secret=None))
+
+    with (
+        patch.object(
+            client, "create_secret", wraps=client.create_secret
+        ) as mock_create,
+        patch.object(
+            get_backend("aws"), "encrypt", wraps=get_backend("aws").encrypt
+        ) as mock_encrypt,
+    ):
+        models.ModelTextAWS.objects.bulk_create(objs)
+        # duplicates are only encrypted once and not again on insert
+        assert mock_create.call_count == 10
+        assert mock_encrypt.call_count == 10
+
+    get_backend("aws").invalidate()
+    instances = list(models.ModelTextAWS.objects.prefetch_secrets().order_by("pk"))
+    assert [instance.secret.get() for instance in instances[:30]] == [
+        f"secret-{i % 10}" for i in range(30)
+    ]
+    assert instances[30].secret.get() is None
+    # the instances keep their plaintext values
+    assert objs[0].secret == "secret-0"
+
+
+def test_bulk_create_json() -> None:
+    objs = [
+        models.ModelJSONStatic(secret={"test": "supersecret"}),
+        models.ModelJSONStatic(secret=[1, 2, 3]),
+        models.ModelJSONStatic(secret=None),
+    ]
+    with patch.object(
+        get_backend("static"), "encrypt", wraps=get_backend("static").encrypt
+    ) as mock_encrypt:
+        models.ModelJSONStatic.objects.bulk_create(objs)
+        assert mock_encrypt.call_count == 0
+    assert [
+        instance.secret for instance in models.ModelJSONStatic.objects.order_by("pk")
+    ] == [
+        {"test": "supersecret"},
+        [1, 2, 3],
+        None,
+    ]
+
+
+def test_bulk_create_error() -> None:
+    with patch.object(
+        get_backend("static"), "encrypt_many", return_value=[ValueError("failed")]
+    ):
+        with pytest.raises(ValueError):
+            models.ModelTextStatic.objects.bulk_create(
+                [models.ModelTextStatic(secret="supersecret")]
+            )
+    assert not models.ModelTextStatic.objects.exists()
+
+
+def test_bulk_update(client) -> None:
+    for i in range(5):
+        models.ModelTextAWS.objects.create(secret=f"secret-{i}")
+    instances = list(models.ModelTextAWS.objects.order_by("pk"))
+    for i, instance in enumerate(instances):
+        instance.secret = f"updated-{i % 2}"
+
+    with patch.object(
+        client, "create_secret", wraps=client.create_secret
+    ) as mock_create:
+        models.ModelTextAWS.objects.bulk_update(instances, ["secret"])
+        assert mock_create.call_count == 2
+
+    instances = list(models.ModelTextAWS.objects.order_by("pk"))
+    assert [instance.secret.get() for instance in instances] == [
+        f"updated-{i % 2}" for i in range(5)
+    ]
+
+
+def test_bulk_update_json_unchanged() -> None:
+    for i in range(5):
+        models.ModelJSONStatic.objects.create(secret={"test": i})
+    queryset = models.ModelJSONStatic.objects.order_by("pk")
+    stored = list(queryset.values_list("secret", flat=True))
+    with deferred_decryption():
+        ciphertexts = [
+            secret.ciphertext for secret in queryset.values_list("secret", flat=True)
+        ]
+    instances = list(queryset)
+    backend = get_backend("static")
+
+    with (
+        patch.object(backend, "encrypt", wraps=backend.encrypt) as mock_encrypt,
+        patch.object(
+            backend, "encrypt_many", wraps=backend.encrypt_many
+        ) as mock_encrypt_many,
+    ):
+        models.ModelJSONStatic.objects.bulk_update(instances, ["secret"])
+        assert mock_encrypt.call_count == 0
+        assert mock_encrypt_many.call_count == 0
+
+        instances[0].secret["test"] = "changed"
+        instances[1].secret = {"test": "replaced"}
+        models.ModelJSONStatic.objects.bulk_update(instances, ["secret"])
+        assert mock_encrypt.call_count == 0
+        assert mock_encrypt_many.call_count == 1
+        assert len(mock_encrypt_many.call_args.args[0]) == 2
+
+    with deferred_decryption():
+        after = [
+            secret.ciphertext for secret in queryset.values_list("secret", flat=True)
+        ]
+    assert after[2:] == ciphertexts[2:]
+    assert list(queryset.values_list("secret", flat=True)) == [
+        {"test": "changed"},
+        {"test": "replaced"},
+        *stored[2:],
+    ]
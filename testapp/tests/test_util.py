@@ -1,6 +1,10 @@
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.utils.module_loading import import_string
 from secrets_fields.util import get_config, get_backend
 
 
@@ -26,3 +30,40 @@ def test_get_backend_missing_backend(monkeypatch):
         ImproperlyConfigured, match="DJANGO_SECRETS_FIELDS\['backend'\] is not set"
     ):
         get_backend()
+
+
+def test_get_backend_cached(monkeypatch):
+    monkeypatch.setattr(
+        settings,
+        "DJANGO_SECRETS_FIELDS",
+        {"default": {"backend": "secrets_fields.backends.backends.BaseSecretsBackend"}},
+    )
+    with patch("secrets_fields.util.import_string", wraps=import_string) as mock:
+        backend = get_backend()
+        assert get_backend() is backend
+        assert mock.call_count == 1
+
+
+def test_get_backend_reset_on_setting_changed():
+    backend = get_backend("static")
+    assert get_backend("static") is backend
+    with override_settings(
+        DJANGO_SECRETS_FIELDS={
+            "static": {
+                "backend": "secrets_fields.backends.encrypted.EncryptedBackend",
+                "encryption_key": b"M2jpxoWkyHXU51ZR0MIEDH0CUkAcivC_TJ-6dpTD29s=",
+            },
+        }
+    ):
+        overridden = get_backend("static")
+        assert overridden is not backend
+        assert overridden.config["encryption_key"] == (
+            b"M2jpxoWkyHXU51ZR0MIEDH0CUkAcivC_TJ-6dpTD29s="
+        )
+    assert get_backend("static") is not overridden
+
+
+def test_get_backend_threads():
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        backends = list(executor.map(lambda _: get_backend("static"), range(32)))
+    assert all(backend is backends[0] for backend in backends)
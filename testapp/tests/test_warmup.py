@@ -0,0 +1,193 @@
+import logging
+import pytest
+import threading
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_started
+from cryptography.fernet import Fernet
+from django.conf import settings
+from django.test import override_settings
+from io import StringIO
+from moto import mock_aws
+from secrets_fields import warmup
+from secrets_fields.util import get_backend
+from secrets_fields.warmup import (
+    warm_up,
+    warm_up_in_background,
+    wait_for_warm_up,
+    warm_up_on_first_request,
+)
+from testapp.configs import models
+from unittest.mock import patch
+
+
+@pytest.mark.django_db(transaction=True)
+@mock_aws
+def test_warm_up_fields():
+    models.ModelTextAWS.objects.create(secret="one")
+    models.ModelTextAWS.objects.create(secret="two")
+    models.ModelTextAWS.objects.create(secret=None)
+    models.ModelJSONAWS.objects.create(secret={"test": "123"})
+    backend = get_backend("aws")
+    backend.invalidate()
+
+    result = warm_up(
+        fields=[
+            f"{models.ModelTextAWS._meta.label}.secret",
+            f"{models.ModelJSONAWS._meta.label}.secret",
+        ]
+    )
+    assert result.ok
+    assert result.loaded == 3
+    assert len(backend.cache) == 3
+
+    with patch.object(backend, "_batch_get") as batch_get:
+        values = models.ModelTextAWS.objects.exclude(secret=None)
+        assert {instance.secret.get() for instance in values} == {"one", "two"}
+    batch_get.assert_not_called()
+
+
+@pytest.mark.django_db
+@mock_aws
+def test_warm_up_backends():
+    backend = get_backend("aws")
+    names = [backend.encrypt(f"secret-{i}") for i in range(3)]
+    backend.client_rw.create_secret(Name="/other/secret", SecretString="other")
+    backend.invalidate()
+
+    result = warm_up(backends=["aws"])
+    assert result.ok
+    assert result.loaded == 3
+    assert {name: backend.cache.get(name) for name in names} == {
+        name: f"secret-{i}" for i, name in enumerate(names)
+    }
+    assert backend.cache.get("/other/secret") is None
+
+    # backends without a cache have nothing to load
+    assert warm_up(backends=["static"]).loaded == 0
+
+
+@pytest.mark.django_db
+def test_warm_up_errors():
+    result = warm_up(
+        fields=["configs.Missing.secret", f"{models.ModelTextStatic._meta.label}.id"],
+        backends=["missing"],
+    )
+    assert not result.ok
+    assert result.loaded == 0
+    assert sorted(error.split(":")[0] for error in result.errors) == [
+        "configs.Missing.secret",
+        "missing",
+        f"{models.ModelTextStatic._meta.label}.id",
+    ]
+    assert not result.timed_out
+
+
+def test_warm_up_timeout():
+    release = threading.Event()
+
+    def slow(alias):
+        release.wait(5)
+        return 1
+
+    with patch.object(warmup, "warm_backend", slow):
+        result = warm_up(backends=["aws"], timeout=0.05)
+    release.set()
+    assert result.timed_out
+    assert result.loaded == 0
+
+
+@pytest.mark.django_db
+@mock_aws
+def test_warm_secrets_command():
+    get_backend("aws").encrypt("plaintext")
+    get_backend("aws").invalidate()
+
+    out = StringIO()
+    err = StringIO()
+    call_command("warm_secrets", "--backend=aws", stdout=out, stderr=err)
+    assert "Loaded 1 secrets" in out.getvalue()
+    # only this process was warmed, the web workers do not share its cache
+    assert "aws has no shared_cache" in err.getvalue()
+
+    shared = {
+        **settings.DJANGO_SECRETS_FIELDS,
+        "aws": {
+            **settings.DJANGO_SECRETS_FIELDS["aws"],
+            "shared_cache": "default",
+            "shared_cache_key": Fernet.generate_key(),
+        },
+    }
+    with override_settings(DJANGO_SECRETS_FIELDS=shared):
+        err = StringIO()
+        call_command("warm_secrets", "--backend=aws", stdout=StringIO(), stderr=err)
+        assert err.getvalue() == ""
+
+    with pytest.raises(CommandError, match="Nothing to warm up"):
+        call_command("warm_secrets")
+
+    with override_settings(DJANGO_SECRETS_FIELDS_WARM_UP={"backends": ["aws"]}):
+        out = StringIO()
+        call_command("warm_secrets", stdout=out)
+        assert "Loaded 1 secrets" in out.getvalue()
+
+    err = StringIO()
+    with pytest.raises(CommandError, match="1 failed"):
+        call_command("warm_secrets", "--backend=aws", "--backend=missing", stderr=err)
+    assert err.getvalue().startswith("missing: ")
+
+    with patch.object(warmup, "warm_backend", lambda alias: threading.Event().wait(1)):
+        with pytest.raises(CommandError, match="timed out"):
+            call_command("warm_secrets", "--backend=aws", "--timeout=0.05")
+
+
+@mock_aws
+def test_warm_up_in_background(caplog):
+    warmup._finished.clear()
+    assert warm_up_in_background() is None
+    # startup is off by default
+    with override_settings(DJANGO_SECRETS_FIELDS_WARM_UP={"backends": ["aws"]}):
+        assert warm_up_in_background() is None
+
+    get_backend("aws").encrypt("plaintext")
+    get_backend("aws").invalidate()
+    with (
+        override_settings(
+            DJANGO_SECRETS_FIELDS_WARM_UP={
+                "backends": ["aws", "missing"],
+                "startup": True,
+            }
+        ),
+        caplog.at_level(logging.INFO, logger="secrets_fields.warmup"),
+    ):
+        thread = warm_up_in_background()
+        assert thread is not None
+        thread.join(5)
+
+    assert "Warmed up 1 secrets" in caplog.text
+    assert "Warming up secrets failed: missing: " in caplog.text
+    # a readiness check can wait for the result
+    result = wait_for_warm_up(1)
+    assert result is not None
+    assert result.loaded == 1
+    assert not result.ok
+
+
+def test_wait_for_warm_up():
+    warmup._finished.clear()
+    assert wait_for_warm_up(0.01) is None
+
+
+def test_warm_up_on_first_request():
+    with patch.object(warmup, "warm_up_in_background") as start:
+        warm_up_on_first_request()
+        request_started.send(sender=None)
+        start.assert_not_called()
+
+        config = {"backends": ["aws"], "startup": True}
+        with override_settings(DJANGO_SECRETS_FIELDS_WARM_UP=config):
+            warm_up_on_first_request()
+        start.assert_not_called()
+        request_started.send(sender=None)
+        request_started.send(sender=None)
+    start.assert_called_once_with()